@@ -1,46 +1,195 @@
 import os
 import re
 import csv
+import json
+import time
+import fnmatch
+import argparse
 
-SCRIPT_EXTENSIONS = ['.ps1', '.sh']
+from fs_scan import DEFAULT_IGNORES, KeywordMatcher, map_file, scan_tree
+from ps_cache import DEFAULT_CACHE_FILE, AnalysisCache, read_stamped
+from ps_source import decode_bytes
+from ps_stats import add_arguments, from_arguments, profiled, report, timed
 
-def find_all_scripts(base_path):
+SCRIPT_EXTENSIONS = ['.ps1', '.sh']
+YAML_EXTENSION = '.yaml'
+TEMPLATE_EXTENSIONS = ['.yaml', '.yml']
+YAML_REFS_CACHE_KIND = "yaml-script-paths"
+
+PATH_SEPARATOR_RE = re.compile(r'[\\/]+')
+
+# "- template: path" steps/jobs/stages and "extends: template: path"
+TEMPLATE_RE = re.compile(r'^[ \t]*(?:-[ \t]*)?template:[ \t]*[\'"]?([^\s\'"#]+)', re.MULTILINE)
+
+EXCEPTION_PIPELINES = ["ac5-report.yaml", "rolesync.yaml"]
+DEFAULT_FILTERS = [
+    {"name": "postgres", "keywords": ["postgres"], "pipelines": EXCEPTION_PIPELINES},
+]
+
+def scan_repository(base_path, ignore=None, threads=0, stats=None):
+    # One walk feeds both find_all_scripts and find_postgres_yaml_files
+    with timed(stats, 'scan'):
+        return scan_tree(base_path, SCRIPT_EXTENSIONS + [YAML_EXTENSION], ignore=ignore, threads=threads)
+
+def find_all_scripts(base_path, scan=None):
+    if scan is None:
+        scan = scan_repository(base_path)
+    paths = []
+    for ext in SCRIPT_EXTENSIONS:
+        paths.extend(scan[ext])
+    return script_labels(paths, base_path)
+
+def script_labels(paths, base_path):
+    # {label: path}. A script is labelled by its lower-cased file name, or by
+    # its lower-cased path relative to base_path when several scripts share
+    # that name, so same-named scripts in different folders stay apart.
+    counts = {}
+    for path in paths:
+        name = os.path.basename(path).lower()
+        counts[name] = counts.get(name, 0) + 1
     script_map = {}
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if any(file.endswith(ext) for ext in SCRIPT_EXTENSIONS):
-                path = os.path.join(root, file)
-                script_map[file.lower()] = path
+    for path in paths:
+        name = os.path.basename(path).lower()
+        if counts[name] > 1:
+            name = os.path.relpath(path, base_path).replace(os.sep, "/").lower()
+        script_map[name] = path
     return script_map
 
-def find_postgres_yaml_files(base_path):
-    EXCEPTION_PIPELINES = ["ac5-report.yaml", "rolesync.yaml"]
-    matched = []
-
-    for root, dirs, files in os.walk(base_path):
-        for file in files:
-            if not file.endswith(".yaml"):
-                continue
-
-            full_path = os.path.join(root, file)
-
-            include = False
-            lower_file = file.lower()
-
-            if "postgres" in lower_file or file in EXCEPTION_PIPELINES:
-                include = True
-
+def pipeline_labels(paths, base_path):
+    # {path: label}. A pipeline is labelled by its file name, or by its path
+    # relative to base_path when several pipelines share that name (every
+    # service folder may hold its own azure-pipelines.yaml).
+    paths = list(dict.fromkeys(paths))
+    counts = {}
+    for path in paths:
+        name = os.path.basename(path)
+        counts[name] = counts.get(name, 0) + 1
+    labels = {}
+    for path in paths:
+        name = os.path.basename(path)
+        if counts[name] > 1:
+            name = os.path.relpath(path, base_path).replace(os.sep, "/")
+        labels[path] = name
+    return labels
+
+def path_components(path):
+    return PATH_SEPARATOR_RE.split(path.lower())
+
+class _SuffixNode(object):
+    __slots__ = ('children', 'labels')
+
+    def __init__(self):
+        self.children = {}
+        self.labels = []
+
+class ScriptIndex(object):
+    # Trie over reversed path components of every script (file name first),
+    # so a reference resolves by longest suffix match in time proportional
+    # to its own length. Each node lists the scripts below it.
+
+    def __init__(self, all_scripts):
+        self.root = _SuffixNode()
+        for label, path in all_scripts.items():
+            node = self.root
+            for part in reversed(path_components(path)):
+                if not part:
+                    continue
+                node = node.children.setdefault(part, _SuffixNode())
+                node.labels.append(label)
+
+    def resolve(self, reference):
+        # Labels of the scripts sharing the longest path suffix with
+        # reference; several when the reference is ambiguous, none when even
+        # the file name is unknown. Matching stops at variables such as
+        # $(Build.SourcesDirectory) and at relative markers.
+        node = self.root
+        for part in reversed(path_components(reference)):
+            if not part or part in (".", "..") or "$" in part:
+                break
+            child = node.children.get(part)
+            if child is None:
+                break
+            node = child
+        return node.labels if node is not self.root else []
+
+def load_filters(config_file):
+    # JSON list of filters, e.g.
+    #   [{"name": "postgres", "keywords": ["postgres"], "regexes": [],
+    #     "paths": ["pipelines/db/*"], "pipelines": ["rolesync.yaml"]}]
+    # Keywords and regexes both match case-insensitively against the raw
+    # file; paths are globs on the path relative to the base.
+    with open(config_file, "r") as f:
+        filters = json.load(f)
+    for pipeline_filter in filters:
+        if not pipeline_filter.get("name"):
+            raise ValueError("Every pipeline filter needs a name: {0}".format(pipeline_filter))
+    return filters
+
+def find_pipelines(base_path, filters, scan=None, stats=None):
+    # Matches every YAML against all filters in one pass: one multi-keyword
+    # scan per file plus the filters' regexes and path globs. Returns
+    # {filter name: [(file, full_path, content)]}.
+    if scan is None:
+        scan = scan_repository(base_path, stats=stats)
+    with timed(stats, 'match'):
+        return _match_pipelines(base_path, filters, scan, stats)
+
+def _match_pipelines(base_path, filters, scan, stats):
+    matcher = KeywordMatcher([kw for flt in filters for kw in flt.get("keywords", [])])
+    compiled = []
+    for flt in filters:
+        compiled.append((
+            flt["name"],
+            set(kw.lower() for kw in flt.get("keywords", [])),
+            [re.compile(rx.encode("utf-8"), re.IGNORECASE) for rx in flt.get("regexes", [])],
+            flt.get("paths", []),
+            set(flt.get("pipelines", [])),
+        ))
+    matched = dict((flt["name"], []) for flt in filters)
+
+    for full_path in scan[YAML_EXTENSION]:
+        started = time.perf_counter()
+        file = os.path.basename(full_path)
+        rel_path = os.path.relpath(full_path, base_path).replace(os.sep, "/")
+
+        try:
+            data = map_file(full_path)
             try:
+                if stats is not None:
+                    stats.count('bytes_read', len(data))
+                keywords = matcher.search(data)
+                names = []
+                for name, flt_keywords, regexes, paths, pipelines in compiled:
+                    if (file in pipelines
+                            or not flt_keywords.isdisjoint(keywords)
+                            or any(fnmatch.fnmatch(rel_path, glob) for glob in paths)
+                            or any(rx.search(data) for rx in regexes)):
+                        names.append(name)
+            finally:
+                if data:
+                    data.close()
+
+            # Only pipelines that pass a filter are read in full
+            if names:
                 with open(full_path, "r") as f:
                     content = f.read().lower()
-                    if "postgres" in content or file in EXCEPTION_PIPELINES:
-                        matched.append((file, full_path, content))
-            except Exception as e:
-                print("Could not read YAML file: {0}".format(full_path))
+                for name in names:
+                    matched[name].append((file, full_path, content))
+        except Exception as e:
+            print("Could not read YAML file: {0}".format(full_path))
+        if stats is not None:
+            stats.file_done(full_path, time.perf_counter() - started)
 
     return matched
 
+def find_postgres_yaml_files(base_path, scan=None):
+    return find_pipelines(base_path, DEFAULT_FILTERS, scan)["postgres"]
+
 def extract_script_references(yaml_content):
+    # File names only; see extract_script_paths for the full references
+    return list(set(os.path.basename(path) for path in extract_script_paths(yaml_content)))
+
+def extract_script_paths(yaml_content):
     scripts = []
     lines = yaml_content.splitlines()
     found_bash_block = False
@@ -57,8 +206,7 @@ def extract_script_references(yaml_content):
             matches = re.findall(r'([^\s\'"=]+\.ps1)', line_lower)
             matches += re.findall(r'([^\s\'"=]+\.sh)', line_lower)
             for match in matches:
-                script_name = os.path.basename(match.strip())
-                scripts.append(script_name)
+                scripts.append(match.strip())
 
     # ✅ If bash block found, and no scripts mentioned, add marker
     if found_bash_block and not scripts:
@@ -66,38 +214,218 @@ def extract_script_references(yaml_content):
 
     return list(set(scripts))
 
-def build_matrix(pipelines, all_scripts):
-    matrix = {}
+def cached_script_references(yaml_path, content, cache=None):
+    if cache is None:
+        return extract_script_paths(content)
+    scripts = cache.lookup(YAML_REFS_CACHE_KIND, yaml_path)
+    if scripts is None:
+        # content may have been read long before; the cached entry is taken
+        # from a fresh read so its stamp matches the bytes it came from
+        try:
+            data, stamp = read_stamped(yaml_path)
+        except OSError:
+            return extract_script_paths(content)
+        scripts = extract_script_paths(decode_bytes(data)[0].lower())
+        cache.store(YAML_REFS_CACHE_KIND, yaml_path, scripts, stamp)
+    return scripts
+
+def extract_template_references(yaml_content):
+    # template: includes of a pipeline or template file, in order. Templates
+    # from other repositories (path@repo) and paths built from expressions
+    # cannot be resolved statically and are skipped.
+    templates = []
+    for match in TEMPLATE_RE.finditer(yaml_content):
+        target = match.group(1)
+        if "@" in target or "${{" in target or "$(" in target:
+            continue
+        templates.append(target)
+    return templates
+
+class TemplateResolver(object):
+    # Flattens template: includes into per-pipeline script sets. Every file
+    # is read and scanned once, and the flattened result of every template
+    # is memoized, so a shared template costs one parse however many
+    # pipelines include it. An include that leads back into the current
+    # chain is recorded in cycles and not followed (Azure DevOps rejects
+    # such pipelines anyway, and results inside the loop are partial).
+
+    def __init__(self, base_path, cache=None):
+        self.base_path = base_path
+        self.cache = cache
+        self.cycles = []
+        self.missing = set()
+        self._parsed = {}
+        self._flat = {}
+        self._located = {}
+
+    def _locate(self, including, target):
+        # Template paths are relative to the including file, or to the
+        # repository root with a leading "/". Pipeline content is
+        # lower-cased, so the file name is matched case-insensitively.
+        if target.startswith("/"):
+            path = os.path.join(self.base_path, target.lstrip("/"))
+        else:
+            path = os.path.join(os.path.dirname(including), target)
+        path = os.path.normpath(path)
+        if path not in self._located:
+            self._located[path] = self._match_case(path)
+        return self._located[path] or path
+
+    def _match_case(self, path):
+        if os.path.exists(path):
+            return path
+        parent, name = os.path.split(path)
+        if not name or parent == path:
+            return None
+        if parent:
+            parent = self._match_case(parent)
+            if parent is None:
+                return None
+        try:
+            for entry in os.listdir(parent or "."):
+                if entry.lower() == name.lower():
+                    return os.path.join(parent, entry)
+        except OSError:
+            pass
+        return None
+
+    def _parse(self, path, content=None):
+        parsed = self._parsed.get(path)
+        if parsed is None:
+            if content is None:
+                try:
+                    with open(path, "r") as f:
+                        content = f.read().lower()
+                except (OSError, UnicodeDecodeError):
+                    self.missing.add(path)
+                    content = ""
+            scripts = cached_script_references(path, content, self.cache) if content else []
+            templates = [self._locate(path, target) for target in extract_template_references(content)]
+            parsed = self._parsed[path] = (scripts, templates)
+        return parsed
+
+    def expand(self, yaml_path, content=None):
+        # Returns (script names, template paths) reachable from yaml_path.
+        return self._expand(os.path.normpath(yaml_path), content, [])
+
+    def _expand(self, path, content, chain):
+        flat = self._flat.get(path)
+        if flat is not None:
+            return flat
+
+        chain.append(path)
+        direct_scripts, templates = self._parse(path, content)
+        scripts = set(direct_scripts)
+        included = set()
+        for template in templates:
+            if template in chain:
+                self.cycles.append(chain[chain.index(template):] + [template])
+                continue
+            included.add(template)
+            sub_scripts, sub_templates = self._expand(template, None, chain)
+            scripts |= sub_scripts
+            included |= sub_templates
+        chain.pop()
+
+        flat = self._flat[path] = (frozenset(scripts), frozenset(included))
+        return flat
+
+class UsageMatrix(object):
+    # Sparse pipeline/script usage: names are interned to integer ids and
+    # only actual references are stored, in both directions. Pipelines are
+    # interned by path and shown by their label (see pipeline_labels), so
+    # same-named pipelines in different folders stay apart.
+
+    def __init__(self):
+        self.scripts = []
+        self.script_ids = {}
+        self.pipelines = []
+        self.pipeline_paths = []
+        self.pipeline_ids = {}
+        self.label_ids = {}
+        self.by_script = []
+        self.by_pipeline = []
+
+    def add_script(self, name):
+        sid = self.script_ids.get(name)
+        if sid is None:
+            sid = self.script_ids[name] = len(self.scripts)
+            self.scripts.append(name)
+            self.by_script.append(set())
+        return sid
+
+    def add_pipeline(self, path, label=None):
+        pid = self.pipeline_ids.get(path)
+        if pid is None:
+            pid = self.pipeline_ids[path] = len(self.pipelines)
+            label = label or path
+            self.pipelines.append(label)
+            self.pipeline_paths.append(path)
+            self.label_ids[label] = pid
+            self.by_pipeline.append(set())
+        return pid
+
+    def pipeline_id(self, pipeline):
+        # Id of a pipeline given by path or by label, or None
+        pid = self.pipeline_ids.get(pipeline)
+        return pid if pid is not None else self.label_ids.get(pipeline)
+
+    def link(self, sid, pid):
+        self.by_script[sid].add(pid)
+        self.by_pipeline[pid].add(sid)
+
+    def uses(self, script, pipeline):
+        sid = self.script_ids.get(script)
+        pid = self.pipeline_id(pipeline)
+        return sid is not None and pid is not None and pid in self.by_script[sid]
+
+    def pipelines_for(self, script):
+        sid = self.script_ids.get(script)
+        if sid is None:
+            return []
+        return [self.pipelines[pid] for pid in sorted(self.by_script[sid])]
+
+    def scripts_for(self, pipeline):
+        pid = self.pipeline_id(pipeline)
+        if pid is None:
+            return []
+        return [self.scripts[sid] for sid in sorted(self.by_pipeline[pid])]
+
+    def edge_count(self):
+        return sum(len(pids) for pids in self.by_script)
+
+def build_matrix(pipelines, all_scripts, cache=None, resolver=None, script_index=None, stats=None):
+    # Pass one resolver / script index to several calls to share them
+    if resolver is None:
+        resolver = TemplateResolver(".", cache)
+    labels = pipeline_labels([yaml_path for file, yaml_path, content in pipelines], resolver.base_path)
+    references = []
+    with timed(stats, 'templates'):
+        for file, yaml_path, content in pipelines:
+            scripts, templates = resolver.expand(yaml_path, content)
+            references.append((labels[yaml_path], yaml_path, sorted(scripts)))
+    with timed(stats, 'matrix'):
+        return matrix_from_references(references, all_scripts, script_index)
+
+def matrix_from_references(references, all_scripts, script_index=None):
+    # references: [(pipeline label, pipeline path, referenced script paths)]
+    if script_index is None:
+        script_index = ScriptIndex(all_scripts)
+    matrix = UsageMatrix()
     for script_name in all_scripts.keys():
-        matrix[script_name] = {}
-    for pipeline_name, yaml_path, content in pipelines:
-        referenced_scripts = extract_script_references(content)
-        for script in matrix:
-            matrix[script][pipeline_name] = "✓" if script in referenced_scripts else ""
+        matrix.add_script(script_name)
+    for label, path, referenced_scripts in references:
+        pid = matrix.add_pipeline(path, label)
+        for reference in referenced_scripts:
+            for script in script_index.resolve(reference):
+                matrix.link(matrix.script_ids[script], pid)
     return matrix
 
 def write_csv(matrix, pipelines, out_file):
-    pipeline_names = [p[0] for p in pipelines]
-    with open(out_file, "w") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Script File"] + pipeline_names)
-        for script, usage in matrix.items():
-            row = [script]
-            for name in pipeline_names:
-                row.append(usage.get(name, ""))
-            writer.writerow(row)
+    write_matrix_outputs(matrix, pipelines, csv_file=out_file)
 
-def generate_html_from_csv(csv_file, html_file):
-    import csv
-    with open(csv_file, "r") as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-
-    headers = rows[0]
-
-    with open(html_file, "w") as f:
-        f.write("<html><head><title>Pipeline-Script Matrix</title>\n")
-        f.write("""
+MATRIX_HTML_HEAD = ("<html><head><title>Pipeline-Script Matrix</title>\n"
+                    + """
         <style>
         body { font-family: Arial; padding: 20px; }
         input { padding: 6px; width: 300px; margin-bottom: 15px; font-size: 14px; }
@@ -105,105 +433,283 @@ def generate_html_from_csv(csv_file, html_file):
         th { background-color: #f2f2f2; }
         td.tick { color: green; font-weight: bold; }
         .hide { display: none; }
+        #matrix.filtering tr { display: none; }
+        #matrix.filtering tr:first-child, #matrix.filtering tr.on { display: table-row; }
+        #matrix.filtering th, #matrix.filtering td { display: none; }
+        #matrix.filtering tr > :first-child { display: table-cell; }
         </style>
+        <style id="columns"></style>
+        """
+                    + "</head><body>\n"
+                    + "<h2>Pipeline to Script Mapping</h2>\n"
+                    + '<input type="text" id="search" placeholder="Search script or pipeline name...">\n'
+                    + '<table id="matrix">\n')
+
+# The search runs against MATRIX, a precomputed index emitted after the
+# table: script/pipeline names, adjacency lists in both directions and
+# trigram postings for substring lookups. A keystroke only touches the
+# rows that were or become visible; columns are shown through one
+# generated stylesheet instead of restyling every cell.
+MATRIX_SEARCH_JS = """
         <script>
-        function filterTable() {
-            var input = document.getElementById("search").value.toLowerCase();
+        (function () {
             var table = document.getElementById("matrix");
-            var headers = table.rows[0].cells;
-
-            var matchCol = -1;
-            for (var c = 1; c < headers.length; c++) {
-                if (headers[c].textContent.toLowerCase().indexOf(input) > -1) {
-                    matchCol = c;
-                    break;
+            var columnStyle = document.getElementById("columns");
+            var shown = [], timer = null;
+
+            function find(query, names, trigrams) {
+                // Lowest id whose name contains query, or -1
+                if (query.length < 3) {
+                    for (var i = 0; i < names.length; i++) {
+                        if (names[i].indexOf(query) > -1) return i;
+                    }
+                    return -1;
                 }
-            }
-
-            var matchRow = -1;
-            for (var r = 1; r < table.rows.length; r++) {
-                var rowHeader = table.rows[r].cells[0].textContent.toLowerCase();
-                if (rowHeader.indexOf(input) > -1) {
-                    matchRow = r;
-                    break;
+                var best = null;
+                for (var k = 0; k + 3 <= query.length; k++) {
+                    var ids = trigrams[query.substr(k, 3)];
+                    if (!ids) return -1;
+                    if (best === null || ids.length < best.length) best = ids;
+                }
+                for (var j = 0; j < best.length; j++) {
+                    if (names[best[j]].indexOf(query) > -1) return best[j];
                 }
+                return -1;
             }
 
-            for (var r = 1; r < table.rows.length; r++) {
-                var row = table.rows[r];
-                var showRow = false;
+            function filterTable() {
+                var input = document.getElementById("search").value.toLowerCase();
+                for (var i = 0; i < shown.length; i++) table.rows[shown[i]].className = "";
+                shown = [];
 
-                if (matchRow === r) {
-                    showRow = true;
-                } else if (matchCol > 0 && row.cells[matchCol].textContent.trim() === "✓") {
-                    showRow = true;
+                if (input === "") {
+                    table.className = "";
+                    columnStyle.textContent = "";
+                    return;
                 }
 
-                row.style.display = showRow ? "" : "none";
-            }
+                var matchCol = find(input, MATRIX.pipelineKeys, MATRIX.pipelineTrigrams);
+                var matchRow = find(input, MATRIX.scriptKeys, MATRIX.scriptTrigrams);
 
-            for (var c = 1; c < headers.length; c++) {
-                var show = "";
-                if (matchCol > 0 && c === matchCol) {
-                    show = "";
-                } else if (matchRow > 0) {
-                    var cell = table.rows[matchRow].cells[c];
-                    if (cell.textContent.trim() === "✓") {
-                        show = "";
-                    } else {
-                        show = "none";
-                    }
-                } else if (input === "") {
-                    show = "";
-                } else {
-                    show = "none";
-                }
+                var rows = matchCol > -1 ? MATRIX.pipelineScripts[matchCol].slice() : [];
+                if (matchRow > -1) rows.push(matchRow);
+                var cols = matchRow > -1 ? MATRIX.scriptPipelines[matchRow].slice() : [];
+                if (matchCol > -1) cols.push(matchCol);
 
-                headers[c].style.display = show;
-                for (var r = 1; r < table.rows.length; r++) {
-                    table.rows[r].cells[c].style.display = show;
+                for (var r = 0; r < rows.length; r++) {
+                    shown.push(rows[r] + 1);
+                    table.rows[rows[r] + 1].className = "on";
+                }
+                var rules = [];
+                for (var c = 0; c < cols.length; c++) {
+                    rules.push("#matrix.filtering tr > :nth-child(" + (cols[c] + 2) + ")");
                 }
+                columnStyle.textContent = rules.length ? rules.join(",") + " { display: table-cell; }" : "";
+                table.className = "filtering";
             }
-        }
-        </script>
-        """)
-        f.write("</head><body>\n")
-        f.write("<h2>Pipeline to Script Mapping</h2>\n")
-        f.write('<input type="text" id="search" onkeyup="filterTable()" placeholder="Search script or pipeline name...">\n')
-        f.write('<table id="matrix">\n')
-
-        for i, row in enumerate(rows):
-            f.write("<tr>")
-            for j, cell in enumerate(row):
-                if i == 0:
-                    f.write("<th>{0}</th>".format(cell))
-                else:
-                    if cell.strip() == "✓":
-                        f.write("<td class='tick'>&#10003;</td>")
-                    else:
-                        f.write("<td>{0}</td>".format(cell))
-            f.write("</tr>\n")
-
-        f.write("</table>\n</body></html>")   
-        
-if __name__ == "__main__":
-    BASE = "."
-
-    print("🔍 Scanning for scripts...")
-    all_scripts = find_all_scripts(BASE)
-
-    print("🔍 Searching for postgres pipelines...")
-    pipelines = find_postgres_yaml_files(BASE)
 
-    print("⚙️ Building usage matrix...")
-    matrix = build_matrix(pipelines, all_scripts)
+            document.getElementById("search").addEventListener("input", function () {
+                clearTimeout(timer);
+                timer = setTimeout(filterTable, 120);
+            });
+        })();
+        </script>
+        """
+
+MATRIX_HTML_FOOT = "</table>\n<script>var MATRIX = %s;</script>\n" + MATRIX_SEARCH_JS + "</body></html>"
+
+class MatrixSearchIndex(object):
+    # Collects the client-side search index while rows are rendered.
+
+    def __init__(self, pipeline_names):
+        self.pipeline_names = pipeline_names
+        self.script_names = []
+        self.script_pipelines = []
+        self.pipeline_scripts = [[] for name in pipeline_names]
+
+    def add_row(self, script, cells):
+        sid = len(self.script_names)
+        self.script_names.append(script)
+        ticks = [c for c, cell in enumerate(cells) if cell.strip() == "✓"]
+        self.script_pipelines.append(ticks)
+        for c in ticks:
+            self.pipeline_scripts[c].append(sid)
+
+    @staticmethod
+    def trigrams(keys):
+        postings = {}
+        for i, key in enumerate(keys):
+            for gram in dict.fromkeys(key[k:k + 3] for k in range(len(key) - 2)):
+                postings.setdefault(gram, []).append(i)
+        return postings
+
+    def to_json(self):
+        script_keys = [name.lower() for name in self.script_names]
+        pipeline_keys = [name.lower() for name in self.pipeline_names]
+        data = json.dumps({
+            "scriptKeys": script_keys,
+            "pipelineKeys": pipeline_keys,
+            "scriptPipelines": self.script_pipelines,
+            "pipelineScripts": self.pipeline_scripts,
+            "scriptTrigrams": self.trigrams(script_keys),
+            "pipelineTrigrams": self.trigrams(pipeline_keys),
+        }, ensure_ascii=False, separators=(",", ":"))
+        # Keep a name like "</script>" from closing the script element
+        return data.replace("</", "<\\/")
+
+def matrix_html_row(row, header=False):
+    cells = []
+    for cell in row:
+        if header:
+            cells.append("<th>{0}</th>".format(cell))
+        elif cell.strip() == "✓":
+            cells.append("<td class='tick'>&#10003;</td>")
+        else:
+            cells.append("<td>{0}</td>".format(cell))
+    return "<tr>" + "".join(cells) + "</tr>\n"
 
-    print("📄 Writing CSV...")
-    write_csv(matrix, pipelines, "pipeline_script_matrix.csv")
+def generate_html_from_csv(csv_file, html_file):
+    # Kept for existing CSV files; the main flow renders from the matrix
+    with open(csv_file, "r") as f, open(html_file, "w") as out:
+        out.write(MATRIX_HTML_HEAD)
+        index = None
+        for i, row in enumerate(csv.reader(f)):
+            out.write(matrix_html_row(row, header=(i == 0)))
+            if index is None:
+                index = MatrixSearchIndex(row[1:])
+            else:
+                index.add_row(row[0], row[1:])
+        out.write(MATRIX_HTML_FOOT % (index or MatrixSearchIndex([])).to_json())
+
+def matrix_rows(matrix, pipelines):
+    # Yields (script, referencing pipeline labels, row cells) lazily
+    pids = [matrix.pipeline_ids[p[1]] for p in pipelines]
+    for sid, script in enumerate(matrix.scripts):
+        used = matrix.by_script[sid]
+        cells = ["✓" if pid in used else "" for pid in pids]
+        yield script, [matrix.pipelines[pid] for pid in sorted(used)], cells
+
+def write_matrix_outputs(matrix, pipelines, csv_file=None, html_file=None, json_file=None,
+                         ndjson_file=None, stats=None):
+    with timed(stats, 'write'):
+        _write_matrix_outputs(matrix, pipelines, csv_file, html_file, json_file, ndjson_file)
+    if stats is not None:
+        stats.count_written(*[path for path in (csv_file, html_file, json_file, ndjson_file) if path])
+
+def _write_matrix_outputs(matrix, pipelines, csv_file, html_file, json_file, ndjson_file):
+    # Renders CSV, HTML and JSON side by side in a single pass over the
+    # in-memory matrix; each row is computed once and fanned out to every
+    # requested writer. JSON is sparse: one record per script listing only
+    # the pipelines that reference it. NDJSON has one line per
+    # pipeline -> script edge, flushed as each script row is done.
+    pipeline_names = [matrix.pipelines[matrix.pipeline_ids[p[1]]] for p in pipelines]
+    header = ["Script File"] + pipeline_names
+    files = []
+    try:
+        csv_out = html_out = json_out = ndjson_out = None
+        if csv_file:
+            f = open(csv_file, "w")
+            files.append(f)
+            csv_out = csv.writer(f)
+            csv_out.writerow(header)
+        if html_file:
+            html_out = open(html_file, "w")
+            files.append(html_out)
+            html_out.write(MATRIX_HTML_HEAD)
+            html_out.write(matrix_html_row(header, header=True))
+            index = MatrixSearchIndex(pipeline_names)
+        if json_file:
+            json_out = open(json_file, "w", encoding="utf-8")
+            files.append(json_out)
+            json_out.write('{"pipelines":%s,"scripts":[' % json.dumps(pipeline_names, ensure_ascii=False, separators=(",", ":")))
+        if ndjson_file:
+            ndjson_out = open(ndjson_file, "w", encoding="utf-8")
+            files.append(ndjson_out)
+
+        for i, (script, used_by, cells) in enumerate(matrix_rows(matrix, pipelines)):
+            row = [script] + cells
+            if csv_out:
+                csv_out.writerow(row)
+            if html_out:
+                html_out.write(matrix_html_row(row))
+                index.add_row(script, cells)
+            if json_out:
+                json_out.write(("," if i else "") + json.dumps(
+                    {"script": script, "pipelines": used_by}, ensure_ascii=False, separators=(",", ":")))
+            if ndjson_out and used_by:
+                ndjson_out.writelines(json.dumps(
+                    {"pipeline": pipeline, "script": script}, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    for pipeline in used_by)
+                ndjson_out.flush()
+
+        if html_out:
+            html_out.write(MATRIX_HTML_FOOT % index.to_json())
+        if json_out:
+            json_out.write("]}\n")
+    finally:
+        for f in files:
+            f.close()
+
+def output_name(base, filter_name, filters, ext):
+    # A single filter keeps the historical file names
+    if len(filters) == 1:
+        return "{0}.{1}".format(base, ext)
+    return "{0}_{1}.{2}".format(base, filter_name, ext)
 
-    print("🌐 Generating HTML...")
-    generate_html_from_csv("pipeline_script_matrix.csv", "pipeline_script_matrix.html")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map ADO pipelines to the scripts they reference.")
+    parser.add_argument("base", nargs="?", default=".")
+    parser.add_argument("--filters", help="JSON file with pipeline filters (default: postgres)")
+    parser.add_argument("--ignore", action="append", default=[],
+                        help="glob of paths to skip, on top of {0} (repeatable)".format(", ".join(DEFAULT_IGNORES)))
+    parser.add_argument("--threads", type=int, default=0, help="threads for directory walking")
+    parser.add_argument("--ndjson", action="store_true",
+                        help="also write one pipeline -> script edge per line")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    BASE = args.base
+    filters = load_filters(args.filters) if args.filters else DEFAULT_FILTERS
+    stats = from_arguments(args)
+
+    with profiled(args.profile):
+        print("🔍 Scanning for scripts...")
+        scan = scan_repository(BASE, ignore=DEFAULT_IGNORES + args.ignore, threads=args.threads,
+                               stats=stats)
+        all_scripts = find_all_scripts(BASE, scan)
+        script_index = ScriptIndex(all_scripts)
+
+        print("🔍 Matching pipelines against {0} filter(s)...".format(len(filters)))
+        matched = find_pipelines(BASE, filters, scan, stats)
+
+        created = []
+        with AnalysisCache(DEFAULT_CACHE_FILE) as cache:
+            resolver = TemplateResolver(BASE, cache)
+            for flt in filters:
+                pipelines = matched[flt["name"]]
+                csv_file = output_name("pipeline_script_matrix", flt["name"], filters, "csv")
+                html_file = output_name("pipeline_script_matrix", flt["name"], filters, "html")
+                json_file = output_name("pipeline_script_matrix", flt["name"], filters, "json")
+                ndjson_file = None
+                if args.ndjson:
+                    ndjson_file = output_name("pipeline_script_edges", flt["name"], filters, "ndjson")
+
+                print("⚙️ Building usage matrix for {0} ({1} pipelines)...".format(flt["name"], len(pipelines)))
+                matrix = build_matrix(pipelines, all_scripts, cache, resolver, script_index, stats)
+
+                print("📄 Writing CSV, HTML and JSON...")
+                write_matrix_outputs(matrix, pipelines, csv_file, html_file, json_file, ndjson_file,
+                                     stats)
+                created += [csv_file, html_file, json_file]
+                if ndjson_file:
+                    created.append(ndjson_file)
+
+    for path in sorted(resolver.missing):
+        print("Could not read template: {0}".format(path))
+    for cycle in resolver.cycles:
+        print("Template cycle: {0}".format(" -> ".join(cycle)))
 
     print("\n✅ Done! Files created:")
-    print(" - pipeline_script_matrix.csv")
-    print(" - pipeline_script_matrix.html")
+    for name in created:
+        print(" - " + name)
+    report(stats, args)
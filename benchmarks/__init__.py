@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+# Benchmarks for the analyzers: corpus.py generates deterministic synthetic
+# scripts and pipeline repositories, run.py times the analyzers over them.
+# Run from the repository root with: python -m benchmarks.run --help
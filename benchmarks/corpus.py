@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import os
+import random
+
+# Deterministic synthetic corpora for the benchmarks.
+#
+# The same arguments and seed always produce byte-identical files, so
+# timings from different commits are measured on the same input.
+
+ENCODINGS = ('utf-8', 'utf-8-sig', 'utf-16', 'utf-16-le')
+
+_VERBS = ['Get', 'Set', 'New', 'Remove', 'Invoke', 'Test', 'Update', 'Sync']
+_NOUNS = ['Database', 'Role', 'Backup', 'Config', 'Schema', 'User', 'Report', 'Queue']
+
+
+def function_name(i):
+    return "%s-%s%d" % (_VERBS[i % len(_VERBS)], _NOUNS[(i // len(_VERBS)) % len(_NOUNS)], i)
+
+
+def _block(rng, lines, indent, depth, names):
+    pad = "    " * indent
+    for n in range(rng.randint(2, 4)):
+        lines.append("%s$value%d = %d  # step %d" % (pad, n, rng.randint(0, 999), n))
+    if names:
+        lines.append("%s%s -Name $Name" % (pad, rng.choice(names)))
+    if depth <= 0:
+        lines.append('%sWrite-Host "done { $Name }"' % pad)
+        return
+    kind = rng.randint(0, 3)
+    if kind == 0:
+        lines.append("%sif ($Count -gt %d) {" % (pad, rng.randint(0, 9)))
+        _block(rng, lines, indent + 1, depth - 1, names)
+        lines.append("%s} elseif ($Name) {" % pad)
+        _block(rng, lines, indent + 1, depth - 1, names)
+        lines.append("%s} else {" % pad)
+        lines.append("%s    $fallback = $true" % pad)
+        lines.append("%s}" % pad)
+    elif kind == 1:
+        lines.append("%sforeach ($item in $Items) {" % pad)
+        _block(rng, lines, indent + 1, depth - 1, names)
+        lines.append("%s}" % pad)
+    elif kind == 2:
+        lines.append("%stry {" % pad)
+        _block(rng, lines, indent + 1, depth - 1, names)
+        lines.append("%s} catch {" % pad)
+        lines.append("%s    Write-Error $_" % pad)
+        lines.append("%s}" % pad)
+    else:
+        lines.append("%s$query = @\"" % pad)
+        lines.append("SELECT * FROM t WHERE x = '{ not a brace }'")
+        lines.append("\"@")
+        lines.append("%swhile ($Count -lt 3) {" % pad)
+        _block(rng, lines, indent + 1, depth - 1, names)
+        lines.append("%s    $Count++" % pad)
+        lines.append("%s}" % pad)
+
+
+def powershell_script(functions, depth=2, seed=0):
+    # Returns the text of a script with the given number of functions, each
+    # nesting if/foreach/try/while blocks depth levels deep and calling
+    # other functions of the script.
+    rng = random.Random(seed)
+    names = [function_name(i) for i in range(functions)]
+    lines = ["# Generated benchmark script (seed %d)" % seed, ""]
+    for i, name in enumerate(names):
+        lines.append("<# %s" % name)
+        lines.append("   synopsis { with braces } #>")
+        lines.append("function %s {" % name)
+        lines.append("    param([string]$Name, [int]$Count, $Items)")
+        _block(rng, lines, 1, depth, names[:i])
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def write_text(path, text, encoding='utf-8'):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "w", encoding=encoding, newline="") as f:
+        f.write(text)
+
+
+def script_corpus(out_dir, files, functions, depth=2, encodings=('utf-8', 'utf-16'), seed=0):
+    # Writes files scripts cycling through encodings. Returns
+    # ([paths], total line count).
+    paths = []
+    total_lines = 0
+    for i in range(files):
+        text = powershell_script(functions, depth, seed + i)
+        path = os.path.join(out_dir, "script_%04d.ps1" % i)
+        write_text(path, text, encodings[i % len(encodings)])
+        paths.append(path)
+        total_lines += text.count("\n")
+    return paths, total_lines
+
+
+def pipeline_repo(out_dir, pipelines, scripts, refs_per_pipeline=4, templates=0, seed=0):
+    # Writes a repository with scripts spread over a few component folders
+    # (file names repeat across folders, as in real repos), pipelines that
+    # reference them by path, every fourth mentioning postgres, and shared
+    # templates included by every pipeline. Returns the number of files.
+    rng = random.Random(seed)
+    components = ['db', 'app', 'infra', 'tools']
+    script_paths = []
+    for i in range(scripts):
+        component = components[i % len(components)]
+        ext = '.ps1' if i % 3 else '.sh'
+        rel = "%s/scripts/task_%d%s" % (component, i // len(components), ext)
+        body = powershell_script(2, 1, seed + i) if ext == '.ps1' else "#!/bin/sh\necho %d\n" % i
+        write_text(os.path.join(out_dir, rel), body)
+        script_paths.append(rel)
+
+    template_names = []
+    for t in range(templates):
+        name = "templates/shared_%d.yml" % t
+        steps = ["- pwsh: ./%s" % rng.choice(script_paths) for n in range(refs_per_pipeline)]
+        if t:
+            steps.append("- template: shared_%d.yml" % (t - 1))
+        write_text(os.path.join(out_dir, name), "steps:\n" + "\n".join(steps) + "\n")
+        template_names.append(name)
+
+    for p in range(pipelines):
+        lines = ["# pipeline %d%s" % (p, " postgres" if p % 4 == 0 else ""), "steps:"]
+        for n in range(refs_per_pipeline):
+            script = rng.choice(script_paths)
+            if script.endswith('.sh'):
+                lines.append("- bash: ./%s" % script)
+            else:
+                lines.append("- task: PowerShell@2")
+                lines.append("  inputs:")
+                lines.append("    filePath: '$(Build.SourcesDirectory)/%s'" % script)
+        if template_names:
+            lines.append("- template: ../%s" % template_names[-1])
+        write_text(os.path.join(out_dir, "pipelines", "pipeline_%d.yaml" % p), "\n".join(lines) + "\n")
+
+    return scripts + pipelines + templates
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import corpus
+from script_loader import load_script
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Throughput benchmarks for the analyzers.
+#
+# Every analyzer runs over corpora of increasing size; each measurement runs
+# in a fresh process so peak RSS belongs to that run alone, and the best of
+# --repeat timings is kept. Results (and the scaling exponent between
+# consecutive sizes: 1.0 is linear) are printed and written as JSON, which a
+# later run can take as --baseline to flag regressions.
+
+# ps_engine.py runs once per analysis level, as "ps_engine.py:<level>"
+ENGINE = 'ps_engine.py'
+SCRIPT_ANALYZERS = ['script-flow.py', 'finalscript.py', 'finalscript1.py', 'ps-flow-deep-parser.py',
+                    ENGINE + ':flow', ENGINE + ':summary', ENGINE + ':deep']
+MAPPER = 'Pipeline-script-function-mapping.py'
+
+# Functions per script; each corpus has SCRIPT_FILES files in mixed encodings
+SCRIPT_SIZES = [50, 200, 800]
+QUICK_SCRIPT_SIZES = [20, 80]
+SCRIPT_FILES = 4
+
+# (pipelines, scripts) per synthetic repository
+REPO_SIZES = [(50, 200), (200, 800), (800, 3200)]
+QUICK_REPO_SIZES = [(20, 80), (80, 320)]
+REPO_TEMPLATES = 5
+
+ALL_PIPELINES = [{"name": "all", "paths": ["*"]}]
+
+DEFAULT_RESULTS = "benchmark_results.json"
+DEFAULT_THRESHOLD = 0.10
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_script_analyzer(name, paths, out_dir):
+    if name.startswith(ENGINE + ':'):
+        module = load_script(ENGINE)
+        level = name.split(':', 1)[1]
+        for i, path in enumerate(paths):
+            module.analyze_script(path, os.path.join(out_dir, "report_%d.html" % i), level)
+        return
+    module = load_script(name)
+    for i, path in enumerate(paths):
+        module.parse_powershell_script(path, os.path.join(out_dir, "report_%d.html" % i))
+
+
+def run_mapper(root, out_dir):
+    mapping = load_script(MAPPER)
+    scan = mapping.scan_repository(root)
+    all_scripts = mapping.find_all_scripts(root, scan)
+    matched = mapping.find_pipelines(root, ALL_PIPELINES, scan)
+    pipelines = matched[ALL_PIPELINES[0]["name"]]
+    resolver = mapping.TemplateResolver(root)
+    matrix = mapping.build_matrix(pipelines, all_scripts, None, resolver, mapping.ScriptIndex(all_scripts))
+    mapping.write_matrix_outputs(matrix, pipelines,
+                                 os.path.join(out_dir, "matrix.csv"),
+                                 os.path.join(out_dir, "matrix.html"),
+                                 os.path.join(out_dir, "matrix.json"))
+
+
+def _measure(analyzer, target, repeat):
+    # Runs in a fresh process: returns (best seconds, peak RSS in KB).
+    best = None
+    with tempfile.TemporaryDirectory() as out_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for n in range(repeat):
+                started = time.perf_counter()
+                if analyzer == MAPPER:
+                    run_mapper(target, out_dir)
+                else:
+                    run_script_analyzer(analyzer, target, out_dir)
+                elapsed = time.perf_counter() - started
+                if best is None or elapsed < best:
+                    best = elapsed
+    return best, peak_rss_kb()
+
+
+def measure(analyzer, target, repeat):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_measure, analyzer, target, repeat).result()
+
+
+def run_benchmarks(work_dir, quick=False, repeat=3, depth=2, only=None):
+    results = {}
+
+    def selected(name):
+        return not only or any(part in name for part in only)
+
+    analyzers = [name for name in SCRIPT_ANALYZERS if selected(name)]
+    for size in (QUICK_SCRIPT_SIZES if quick else SCRIPT_SIZES):
+        if not analyzers:
+            break
+        out_dir = os.path.join(work_dir, "scripts_%d" % size)
+        paths, lines = corpus.script_corpus(out_dir, SCRIPT_FILES, size, depth,
+                                            encodings=corpus.ENCODINGS)
+        for name in analyzers:
+            seconds, rss = measure(name, paths, repeat)
+            results.setdefault(name, []).append({
+                'size': size,
+                'files': len(paths),
+                'lines': lines,
+                'seconds': seconds,
+                'lines_per_s': lines / seconds,
+                'files_per_s': len(paths) / seconds,
+                'peak_rss_kb': rss,
+            })
+
+    if selected(MAPPER):
+        for pipelines, scripts in (QUICK_REPO_SIZES if quick else REPO_SIZES):
+            root = os.path.join(work_dir, "repo_%d_%d" % (pipelines, scripts))
+            files = corpus.pipeline_repo(root, pipelines, scripts, templates=REPO_TEMPLATES)
+            seconds, rss = measure(MAPPER, root, repeat)
+            results.setdefault(MAPPER, []).append({
+                'size': pipelines,
+                'scripts': scripts,
+                'files': files,
+                'seconds': seconds,
+                'files_per_s': files / seconds,
+                'peak_rss_kb': rss,
+            })
+
+    # Scaling exponent between consecutive sizes (1.0 = linear), measured
+    # against lines for the script analyzers and files for the mapper
+    for runs in results.values():
+        for prev, run in zip(runs, runs[1:]):
+            grown = float(run.get('lines', run['files'])) / prev.get('lines', prev['files'])
+            run['scaling'] = math.log(run['seconds'] / prev['seconds']) / math.log(grown)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Returns [(analyzer, size, ratio)] for runs slower than the baseline
+    # by more than threshold, printing every comparison.
+    regressions = []
+    for name, runs in sorted(results.items()):
+        base_runs = dict((run['size'], run) for run in baseline.get(name, []))
+        for run in runs:
+            base = base_runs.get(run['size'])
+            if base is None:
+                continue
+            ratio = run['seconds'] / base['seconds']
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  SLOWER"
+                regressions.append((name, run['size'], ratio))
+            elif ratio < 1 - threshold:
+                flag = "  faster"
+            print("  {0:<38} size {1:>5}: {2:6.3f}s vs {3:6.3f}s ({4:+.0%}){5}".format(
+                name, run['size'], run['seconds'], base['seconds'], ratio - 1, flag))
+    return regressions
+
+
+def print_results(results):
+    for name, runs in sorted(results.items()):
+        print(name)
+        for run in runs:
+            rate = ("{0:>10.0f} lines/s".format(run['lines_per_s']) if 'lines_per_s' in run
+                    else "{0:>10.0f} files/s".format(run['files_per_s']))
+            rss = "{0:>7.1f} MB".format(run['peak_rss_kb'] / 1024.0) if run['peak_rss_kb'] else "      -"
+            scaling = "  scaling {0:.2f}".format(run['scaling']) if 'scaling' in run else ""
+            print("  size {0:>5}: {1:7.3f}s {2}  peak {3}{4}".format(
+                run['size'], run['seconds'], rate, rss, scaling))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analyzers on synthetic corpora.")
+    parser.add_argument("--quick", action="store_true", help="small corpora for a fast smoke run")
+    parser.add_argument("--repeat", type=int, default=3, help="timings per measurement; the best is kept")
+    parser.add_argument("--depth", type=int, default=2, help="block nesting depth of generated functions")
+    parser.add_argument("--only", action="append", help="run analyzers whose file name contains this (repeatable)")
+    parser.add_argument("--out", default=DEFAULT_RESULTS, help="results JSON (default: %(default)s)")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmarks(work_dir, quick=args.quick, repeat=args.repeat,
+                                 depth=args.depth, only=args.only)
+
+    print_results(results)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+            'depth': args.depth,
+            'results': results,
+        }, f, indent=2)
+    print("✅ Results written to {0}".format(args.out))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\nCompared with {0}:".format(args.baseline))
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print("❌ {0} regression(s) above {1:.0%}".format(len(regressions), args.threshold))
+            sys.exit(1)
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import os
+import sys
+from collections import deque
+
+from fs_scan import scan_tree
+from impact_graph import ALL_PIPELINES, MAPPER, unique_pipelines
+from ps_cache import DEFAULT_CACHE_FILE, AnalysisCache
+from ps_callgraph import _normalize, import_closure, module_index, resolve_imports
+from ps_tree import POWERSHELL_EXTENSIONS, analyze_file, analyze_tree
+from script_loader import load_script
+
+# Change-impact mode for CI.
+#
+# A persisted index holds everything the impact query needs without
+# re-parsing: the script map; each pipeline's flattened script references,
+# the templates they came through and the script files they resolve to;
+# per PowerShell file its functions (name, line, calls) and imports; and
+# inverted indexes from function name to defining and calling files and
+# from script file to pipelines. Calls only keep names that some file in
+# the tree defined when their own file was indexed.
+#
+# Given the files a PR touched (git diff --name-only), only those files are
+# re-read and only their entries in the index are patched. Callers are
+# then walked outward from the changed functions through the inverted
+# indexes, so a query costs in proportion to the diff and what it reaches,
+# not to the size of the repository. A changed template marks every
+# pipeline that includes it.
+
+INDEX_VERSION = 5
+DEFAULT_INDEX_FILE = "impact_index.json"
+# The index keeps only names, lines and calls, which the summary level has
+INDEX_LEVEL = 'summary'
+
+
+def _key(path):
+    return os.path.normpath(path)
+
+
+def _slim(functions, imports, known=None):
+    # known (lower-cased names defined in the tree) drops every other call
+    # token; None keeps calls as they are
+    slim = []
+    for f in functions:
+        calls = f['calls'] if known is None else [call for call in f['calls'] if call.lower() in known]
+        slim.append({'name': f['name'], 'line': f['line'], 'calls': calls})
+    return {'functions': slim, 'imports': imports}
+
+
+def _add(mapping, key, value):
+    values = mapping.setdefault(key, [])
+    if value not in values:
+        values.append(value)
+
+
+def _discard(mapping, key, value):
+    values = mapping.get(key)
+    if values and value in values:
+        values.remove(value)
+        if not values:
+            del mapping[key]
+
+
+def _link_file(index, path):
+    for func in index['files'][path]['functions']:
+        _add(index['defines'], func['name'].lower(), path)
+        for call in func['calls']:
+            _add(index['callers'], call.lower(), path)
+
+
+def _unlink_file(index, path):
+    entry = index['files'].pop(path, None)
+    for func in entry['functions'] if entry else []:
+        _discard(index['defines'], func['name'].lower(), path)
+        for call in func['calls']:
+            _discard(index['callers'], call.lower(), path)
+
+
+def _link_pipeline(index, entry):
+    for script in entry[4]:
+        _add(index['script_pipelines'], script, entry[1])
+
+
+def _unlink_pipeline(index, entry):
+    for script in entry[4]:
+        _discard(index['script_pipelines'], script, entry[1])
+
+
+def _resolve_refs(script_index, scripts, refs):
+    # Script files the references of one pipeline resolve to
+    return sorted(set(scripts[label] for ref in refs for label in script_index.resolve(ref)))
+
+
+def _pipeline_entry(resolver, script_index, scripts, name, path, content=None):
+    # [label, path, script references, templates, resolved script files]
+    refs, templates = resolver.expand(path, content)
+    return [name, _key(path), sorted(refs), sorted(_key(template) for template in templates),
+            _resolve_refs(script_index, scripts, refs)]
+
+
+def build_index(root, filters=None, workers=None, cache=None):
+    mapping = load_script(MAPPER)
+    if filters is None:
+        filters = ALL_PIPELINES
+
+    extensions = list(POWERSHELL_EXTENSIONS) + mapping.SCRIPT_EXTENSIONS + [mapping.YAML_EXTENSION]
+    scan = scan_tree(root, extensions)
+    all_scripts = mapping.find_all_scripts(root, scan)
+    pipelines = unique_pipelines(mapping.find_pipelines(root, filters, scan), filters)
+
+    ps_paths = sorted(path for ext in POWERSHELL_EXTENSIONS for path in scan[ext])
+    # Resolved: calls keep only names defined somewhere in the tree
+    tree = analyze_tree(root, workers=workers, cache=cache, paths=ps_paths, level=INDEX_LEVEL)
+    resolver = mapping.TemplateResolver(root, cache)
+    labels = mapping.pipeline_labels([path for name, path, content in pipelines], root)
+    scripts = dict((name, _key(path)) for name, path in all_scripts.items())
+    script_index = mapping.ScriptIndex(scripts)
+
+    index = {
+        'version': INDEX_VERSION,
+        'filters': filters,
+        'scripts': scripts,
+        'pipelines': [_pipeline_entry(resolver, script_index, scripts, labels[path], path, content)
+                      for name, path, content in pipelines],
+        'files': dict((_key(path), _slim(tree['files'][path], tree['imports'][path]))
+                      for path in tree['files']),
+        'defines': {},
+        'callers': {},
+        'script_pipelines': {},
+    }
+    for path in index['files']:
+        _link_file(index, path)
+    for entry in index['pipelines']:
+        _link_pipeline(index, entry)
+    return index
+
+
+def load_index(index_file):
+    with open(index_file, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError("Impact index {0} is from another version; rebuild it".format(index_file))
+    return index
+
+
+def save_index(index, index_file):
+    with open(index_file, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+
+def apply_changes(index, root, changed):
+    # Re-reads only the changed files and patches the index in place.
+    # Returns (the normalized paths that were processed, the lower-cased
+    # names of functions the changed files no longer define).
+    mapping = load_script(MAPPER)
+    pipelines = dict((entry[1], i) for i, entry in enumerate(index['pipelines']))
+    processed = []
+    removed = {}
+    touched = set()
+    analyzed = {}
+    script_names = set()
+    relabel = False
+
+    for name in changed:
+        path = _key(os.path.join(root, name))
+        processed.append(path)
+        exists = os.path.isfile(path)
+        base = os.path.basename(path)
+        ext = os.path.splitext(base)[1].lower()
+
+        if ext in POWERSHELL_EXTENSIONS:
+            if path in index['files']:
+                removed[path] = set(func['name'].lower() for func in index['files'][path]['functions'])
+            _unlink_file(index, path)
+            if exists:
+                analyzed_path, analysis, error = analyze_file(path, level=INDEX_LEVEL)
+                if not error:
+                    analyzed[path] = analysis
+
+        if ext in mapping.SCRIPT_EXTENSIONS:
+            paths = list(index['scripts'].values())
+            if exists != (path in paths):
+                if exists:
+                    paths.append(path)
+                else:
+                    paths.remove(path)
+                # Labels depend on which names collide, so recompute them all
+                index['scripts'] = mapping.script_labels(paths, root)
+                script_names.add(base.lower())
+
+        if ext == mapping.YAML_EXTENSION:
+            matched = []
+            if exists:
+                found = mapping.find_pipelines(root, index['filters'], {mapping.YAML_EXTENSION: [path]})
+                matched = unique_pipelines(found, index['filters'])
+            if path in pipelines:
+                _unlink_pipeline(index, index['pipelines'][pipelines[path]])
+            if matched:
+                file, full_path, content = matched[0]
+                # References are filled in with the template pass below
+                entry = [file, path, [], [], []]
+                if path in pipelines:
+                    entry[0] = index['pipelines'][pipelines[path]][0]
+                    index['pipelines'][pipelines[path]] = entry
+                else:
+                    pipelines[path] = len(index['pipelines'])
+                    index['pipelines'].append(entry)
+                    relabel = True
+            elif path in pipelines:
+                index['pipelines'][pipelines.pop(path)] = None
+                relabel = True
+
+        if ext in mapping.TEMPLATE_EXTENSIONS:
+            touched.add(path)
+
+    # Calls resolve against every name defined after the change
+    known = set(index['defines'])
+    for analysis in analyzed.values():
+        known.update(func['name'].lower() for func in analysis['functions'])
+    for path, analysis in analyzed.items():
+        index['files'][path] = _slim(analysis['functions'], analysis['imports'], known)
+        _link_file(index, path)
+        if path in removed:
+            removed[path].difference_update(func['name'].lower() for func in analysis['functions'])
+
+    if relabel:
+        index['pipelines'] = [entry for entry in index['pipelines'] if entry is not None]
+        # Like script labels, pipeline labels depend on which names collide
+        labels = mapping.pipeline_labels([entry[1] for entry in index['pipelines']], root)
+        for entry in index['pipelines']:
+            entry[0] = labels[entry[1]]
+
+    # Re-expand pipelines that changed or include a changed template, and
+    # re-resolve those referring to a script file name that came or went
+    resolver = mapping.TemplateResolver(root)
+    script_index = None
+    for i, entry in enumerate(index['pipelines']):
+        expand = entry[1] in touched or touched.intersection(entry[3])
+        if not expand and not (script_names and any(
+                mapping.path_components(ref)[-1] in script_names for ref in entry[2])):
+            continue
+        if script_index is None:
+            script_index = mapping.ScriptIndex(index['scripts'])
+        _unlink_pipeline(index, entry)
+        if expand:
+            entry = index['pipelines'][i] = _pipeline_entry(
+                resolver, script_index, index['scripts'], entry[0], entry[1])
+        else:
+            entry[4] = _resolve_refs(script_index, index['scripts'], entry[2])
+        _link_pipeline(index, entry)
+    return processed, sorted(set().union(*removed.values()))
+
+
+class IndexGraph(object):
+    # Call graph queries answered straight from the index. A function is a
+    # (path, position in file) pair and calls resolve by the same rules as
+    # ps_callgraph.CallGraph (same file, then imported files, then every
+    # definition), but only for the names and files a query reaches.
+
+    def __init__(self, index):
+        self.files = index['files']
+        self.defines = index['defines']
+        self.callers = index['callers']
+        self._by_path = None
+        self._modules = None
+        self._imports = {}
+        self._closures = {}
+
+    def _file_imports(self, path):
+        resolved = self._imports.get(path)
+        if resolved is None:
+            if self._by_path is None:
+                self._by_path = dict((_normalize(other), other) for other in self.files)
+                self._modules = module_index(self.files)
+            entry = self.files.get(path)
+            resolved = self._imports[path] = resolve_imports(
+                path, entry['imports'] if entry else [], self._by_path, self._modules)
+        return resolved
+
+    def _import_closure(self, path):
+        closure = self._closures.get(path)
+        if closure is None:
+            closure = self._closures[path] = import_closure(path, self._file_imports)
+        return closure
+
+    def _binds_to(self, caller_path, definers, path):
+        # Whether a call from caller_path binds to the definitions in path,
+        # given every file defining the name
+        if caller_path == path or len(definers) == 1:
+            return True
+        if caller_path in definers:
+            return False
+        imported = definers & self._import_closure(caller_path)
+        return not imported or path in imported
+
+    def callers_of(self, node):
+        path, position = node
+        key = self.files[path]['functions'][position]['name'].lower()
+        definers = set(self.defines.get(key, []))
+        found = []
+        for caller_path in sorted(self.callers.get(key, [])):
+            if not self._binds_to(caller_path, definers, path):
+                continue
+            for i, func in enumerate(self.files[caller_path]['functions']):
+                if (caller_path, i) != node and any(call.lower() == key for call in func['calls']):
+                    found.append((caller_path, i))
+        return found
+
+    def calls_to(self, key):
+        # Every function calling the lower-cased name key, bound or not
+        found = []
+        for caller_path in sorted(self.callers.get(key, [])):
+            for i, func in enumerate(self.files[caller_path]['functions']):
+                if any(call.lower() == key for call in func['calls']):
+                    found.append((caller_path, i))
+        return found
+
+    def describe(self, node):
+        path, position = node
+        func = self.files[path]['functions'][position]
+        return {'name': func['name'], 'file': path, 'line': func['line']}
+
+
+def impacted(index, processed, removed=()):
+    # removed: names apply_changes() reported as no longer defined by the
+    # changed files; their callers are affected although nothing in the
+    # changed files is left to reach them from
+    graph = IndexGraph(index)
+    changed = set(processed)
+
+    nodes = set((path, i) for path in changed if path in index['files']
+                for i in range(len(index['files'][path]['functions'])))
+    for name in removed:
+        nodes.update(graph.calls_to(name))
+    # Everything that (transitively) calls a changed function is affected too
+    queue = deque(nodes)
+    while queue:
+        for caller in graph.callers_of(queue.popleft()):
+            if caller not in nodes:
+                nodes.add(caller)
+                queue.append(caller)
+
+    # A pipeline reaches a function through a script that defines it or one
+    # of its callers, so the affected pipelines are those running the files
+    # of affected functions or a changed script
+    reached = set()
+    for path in changed.union(path for path, i in nodes):
+        reached.update(index['script_pipelines'].get(path, []))
+    pipelines = []
+    for name, path, refs, templates, scripts in index['pipelines']:
+        if path in reached or path in changed or changed.intersection(templates):
+            pipelines.append(name)
+
+    return {
+        'changed': sorted(changed),
+        'pipelines': sorted(pipelines),
+        'functions': [graph.describe(node) for node in sorted(nodes)],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report pipelines and functions affected by changed files.")
+    parser.add_argument("changed", nargs="*",
+                        help="changed files relative to --root; '-' reads them from stdin")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--index", default=DEFAULT_INDEX_FILE)
+    parser.add_argument("--filters", help="JSON pipeline filters used when building the index")
+    parser.add_argument("--build", action="store_true", help="(re)build the index from scratch")
+    parser.add_argument("--update-index", action="store_true",
+                        help="write the patched index back after applying changes")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    changed = []
+    for name in args.changed:
+        if name == "-":
+            changed.extend(line.strip() for line in sys.stdin if line.strip())
+        else:
+            changed.append(name)
+
+    if args.build or not os.path.exists(args.index):
+        filters = load_script(MAPPER).load_filters(args.filters) if args.filters else None
+        print("🔍 Building impact index {0}...".format(args.index), file=sys.stderr)
+        with AnalysisCache(DEFAULT_CACHE_FILE) as cache:
+            index = build_index(args.root, filters=filters, workers=args.workers, cache=cache)
+        save_index(index, args.index)
+    else:
+        index = load_index(args.index)
+
+    if changed:
+        known = set(index['defines'])
+        processed, removed = apply_changes(index, args.root, changed)
+        added = sorted(set(index['defines']) - known)
+        if added:
+            # Calls to names nothing defined were not indexed
+            print("Note: {0} new function name(s) ({1}); unchanged files calling them are only "
+                  "linked after --build.".format(len(added), ", ".join(added[:5])), file=sys.stderr)
+        if args.update_index:
+            save_index(index, args.index)
+        result = impacted(index, processed, removed)
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import fnmatch
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# One-pass filesystem scanner shared by the mapping tool and ps_tree.
+#
+# scan_tree() walks the tree once with os.scandir, skips ignored
+# directories, and buckets files by (lower-cased) extension. Directory
+# listing can be spread over a thread pool, which helps on network shares
+# and cold caches where scandir is I/O bound.
+
+DEFAULT_IGNORES = ['.git', 'node_modules', '.venv', '__pycache__']
+
+
+def is_ignored(name, rel_path, ignore):
+    for pattern in ignore:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern):
+            return True
+    return False
+
+
+def _list_dir(path, rel, extensions, ignore):
+    # Returns (files by extension, [(subdir path, subdir rel path)]).
+    files = {}
+    subdirs = []
+    try:
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except OSError:
+        return files, subdirs
+
+    for entry in entries:
+        entry_rel = entry.name if not rel else rel + "/" + entry.name
+        if is_ignored(entry.name, entry_rel, ignore):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, entry_rel))
+                continue
+        except OSError:
+            continue
+        ext = os.path.splitext(entry.name)[1].lower()
+        if ext in extensions:
+            files.setdefault(ext, []).append(entry.path)
+    return files, subdirs
+
+
+def scan_tree(base_path, extensions, ignore=None, threads=0):
+    # Returns {extension: [paths]} in depth-first, name-sorted order.
+    extensions = set(ext.lower() for ext in extensions)
+    if ignore is None:
+        ignore = DEFAULT_IGNORES
+    listings = {}
+
+    if threads and threads > 1:
+        # Breadth-first: list one whole level of directories concurrently
+        level = [(base_path, "")]
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while level:
+                results = pool.map(lambda d: _list_dir(d[0], d[1], extensions, ignore), level)
+                next_level = []
+                for (path, rel), listing in zip(level, results):
+                    listings[path] = listing
+                    next_level.extend(listing[1])
+                level = next_level
+    else:
+        stack = [(base_path, "")]
+        while stack:
+            path, rel = stack.pop()
+            listings[path] = _list_dir(path, rel, extensions, ignore)
+            stack.extend(listings[path][1])
+
+    found = dict((ext, []) for ext in extensions)
+    stack = [base_path]
+    while stack:
+        files, subdirs = listings[stack.pop()]
+        for ext, paths in files.items():
+            found[ext].extend(paths)
+        stack.extend(reversed([sub for sub, sub_rel in subdirs]))
+    return found
+
+
+class KeywordMatcher(object):
+    # Finds which of many keywords occur in a buffer in a single scan.
+    #
+    # All keywords are folded into one case-insensitive alternation inside a
+    # lookahead, so the regex engine reports every position where some
+    # keyword starts (overlaps included) in one pass over the data. Longer
+    # keywords are tried first; a shorter keyword hiding at the same
+    # position is recovered by substring check on the hit.
+
+    def __init__(self, keywords):
+        self.keywords = sorted(set(kw.lower() for kw in keywords if kw), key=len, reverse=True)
+        self.pattern = None
+        if self.keywords:
+            alternation = b"|".join(re.escape(kw.encode("utf-8")) for kw in self.keywords)
+            self.pattern = re.compile(b"(?=(" + alternation + b"))", re.IGNORECASE)
+
+    def search(self, buffer):
+        # Returns the set of keywords present in buffer.
+        found = set()
+        if self.pattern is None:
+            return found
+        hits = set()
+        for m in self.pattern.finditer(buffer):
+            hit = m.group(1).decode("utf-8", "replace").lower()
+            if hit in hits:
+                continue
+            hits.add(hit)
+            for kw in self.keywords:
+                if kw in hit:
+                    found.add(kw)
+            if len(found) == len(self.keywords):
+                break
+        return found
+
+
+def map_file(path):
+    # Read-only memory map of a file, or b"" for an empty one.
+    f = open(path, "rb")
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import argparse
+from collections import deque
+
+from fs_scan import scan_tree
+from ps_cache import DEFAULT_CACHE_FILE, AnalysisCache
+from ps_callgraph import CallGraph
+from ps_tree import POWERSHELL_EXTENSIONS, analyze_tree
+from script_loader import load_script
+
+# End-to-end impact graph: pipeline YAML -> script -> defined functions ->
+# called functions.
+#
+# The pipeline side comes from Pipeline-script-function-mapping.py, the
+# function side from ps_callgraph. The transitive closure is computed once
+# per script (pipelines share scripts heavily) and inverted into a
+# function -> pipelines index, so "which pipelines can reach X?" is a
+# dictionary lookup.
+
+MAPPER = "Pipeline-script-function-mapping.py"
+
+# Every YAML in the tree counts as a pipeline unless filters say otherwise
+ALL_PIPELINES = [{"name": "all", "paths": ["*"]}]
+
+
+class ImpactGraph(object):
+
+    def __init__(self, graph, matrix, all_scripts):
+        self.graph = graph
+        self.matrix = matrix
+        self.all_scripts = all_scripts
+        self.script_functions = {}
+        self.pipeline_functions = []
+        self.function_pipelines = {}
+
+        for pid, pipeline in enumerate(matrix.pipelines):
+            reached = set()
+            for sid in matrix.by_pipeline[pid]:
+                reached |= self._script_closure(matrix.scripts[sid])
+            self.pipeline_functions.append(frozenset(reached))
+            for node in reached:
+                self.function_pipelines.setdefault(node, set()).add(pid)
+
+    def _script_closure(self, script):
+        # Functions defined in a script plus everything they call.
+        closure = self.script_functions.get(script)
+        if closure is None:
+            path = self.all_scripts.get(script)
+            start = self.graph.by_file.get(path, [])
+            closure = set(start)
+            queue = deque(start)
+            while queue:
+                for nxt in self.graph.callees_of(queue.popleft()):
+                    if nxt not in closure:
+                        closure.add(nxt)
+                        queue.append(nxt)
+            closure = frozenset(closure)
+            self.script_functions[script] = closure
+        return closure
+
+    def pipelines_reaching(self, function_name):
+        pids = set()
+        for node in self.graph.find(function_name):
+            pids |= self.function_pipelines.get(node, set())
+        return sorted(self.matrix.pipelines[pid] for pid in pids)
+
+    def functions_reached_by(self, pipeline):
+        pid = self.matrix.pipeline_id(pipeline)
+        if pid is None:
+            return []
+        return sorted(self.pipeline_functions[pid])
+
+    def scripts_of(self, pipeline):
+        return self.matrix.scripts_for(pipeline)
+
+    def pipelines_using_script(self, script):
+        return self.matrix.pipelines_for(script.lower())
+
+
+def unique_pipelines(matched, filters):
+    # Pipelines matched by any filter, each once
+    seen = set()
+    pipelines = []
+    for flt in filters:
+        for pipeline in matched[flt["name"]]:
+            if pipeline[1] not in seen:
+                seen.add(pipeline[1])
+                pipelines.append(pipeline)
+    return pipelines
+
+
+def build_impact_graph(root, filters=None, workers=None, cache=None):
+    mapping = load_script(MAPPER)
+    if filters is None:
+        filters = ALL_PIPELINES
+
+    extensions = list(POWERSHELL_EXTENSIONS) + mapping.SCRIPT_EXTENSIONS + [mapping.YAML_EXTENSION]
+    scan = scan_tree(root, extensions)
+
+    all_scripts = mapping.find_all_scripts(root, scan)
+    pipelines = unique_pipelines(mapping.find_pipelines(root, filters, scan), filters)
+    matrix = mapping.build_matrix(pipelines, all_scripts, cache, mapping.TemplateResolver(root, cache))
+
+    ps_paths = sorted(path for ext in POWERSHELL_EXTENSIONS for path in scan[ext])
+    tree = analyze_tree(root, workers=workers, cache=cache, paths=ps_paths)
+    return ImpactGraph(CallGraph(tree), matrix, all_scripts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline -> script -> function impact queries.")
+    parser.add_argument("root", nargs="?", default=".")
+    parser.add_argument("--filters", help="JSON pipeline filters (default: every YAML)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--function", action="append", default=[],
+                        help="list pipelines that can reach this function (repeatable)")
+    parser.add_argument("--pipeline", action="append", default=[],
+                        help="list scripts and functions this pipeline reaches (repeatable)")
+    args = parser.parse_args()
+
+    mapping = load_script(MAPPER)
+    filters = mapping.load_filters(args.filters) if args.filters else None
+
+    with AnalysisCache(DEFAULT_CACHE_FILE) as cache:
+        impact = build_impact_graph(args.root, filters=filters, workers=args.workers, cache=cache)
+    print("✅ {0} pipelines, {1} scripts, {2} functions.".format(
+        len(impact.matrix.pipelines), len(impact.matrix.scripts), len(impact.graph.names)))
+
+    for name in args.function:
+        pipelines = impact.pipelines_reaching(name)
+        print("\nPipelines reaching {0} ({1}):".format(name, len(pipelines)))
+        for pipeline in pipelines:
+            print(" - " + pipeline)
+
+    for name in args.pipeline:
+        nodes = impact.functions_reached_by(name)
+        print("\nPipeline {0}: scripts {1}, functions ({2}):".format(
+            name, ", ".join(impact.scripts_of(name)) or "-", len(nodes)))
+        for node in nodes:
+            print(" - " + impact.graph.describe(node))
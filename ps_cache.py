@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Persistent analysis cache shared by ps_tree.py and
+# Pipeline-script-function-mapping.py.
+#
+# Entries are keyed by (kind, path) and validated against the file's size,
+# mtime and content hash: a matching size + mtime is trusted without
+# reading the file, otherwise the content is re-hashed so a touched but
+# unchanged file still hits. The stamp stored with an entry is taken when
+# the file is read for analysis (read_stamped), not when the result is
+# stored, so an edit made while the analysis runs is never cached as
+# current. Payloads are JSON documents. When the store
+# grows past max_bytes the least recently used entries are evicted.
+
+DEFAULT_CACHE_FILE = ".analysis_cache.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bump when the shape of a cached payload changes.
+CACHE_VERSION = 8
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (kind, path)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_stamped(path):
+    # Returns (bytes, stamp) for a file about to be analyzed; the stat is
+    # taken before the read and the digest covers the bytes actually read.
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    return data, (st.st_size, st.st_mtime_ns, hashlib.sha1(data).hexdigest())
+
+
+class AnalysisCache(object):
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or int(row[0]) != CACHE_VERSION:
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+            self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, kind, path):
+        # Returns the cached payload for path, or None when missing or stale.
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        row = self.db.execute(
+            "SELECT size, mtime_ns, digest, payload FROM entries WHERE kind = ? AND path = ?",
+            (kind, path)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        size, mtime_ns, digest, payload = row
+        if size != st.st_size:
+            self.misses += 1
+            return None
+        if mtime_ns != st.st_mtime_ns:
+            # Same size, different mtime: trust the content hash
+            if file_digest(path) != digest:
+                self.misses += 1
+                return None
+            self.db.execute(
+                "UPDATE entries SET mtime_ns = ? WHERE kind = ? AND path = ?",
+                (st.st_mtime_ns, kind, path))
+
+        self.db.execute(
+            "UPDATE entries SET last_used = ? WHERE kind = ? AND path = ?",
+            (time.time(), kind, path))
+        self.hits += 1
+        return json.loads(payload)
+
+    def lookup_stale(self, kind, path):
+        # The last payload stored for path even if the file changed since,
+        # or None. Callers reuse the parts whose own content hash still
+        # matches; it does not count as a hit or a miss.
+        row = self.db.execute(
+            "SELECT payload FROM entries WHERE kind = ? AND path = ?",
+            (kind, os.path.abspath(path))).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def store(self, kind, path, payload, stamp):
+        # stamp is the (size, mtime_ns, digest) from read_stamped() for the
+        # bytes payload was computed from.
+        size, mtime_ns, digest = stamp
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (kind, os.path.abspath(path), size, mtime_ns, digest,
+             json.dumps(payload, separators=(",", ":")), time.time()))
+
+    def invalidate(self, path=None, kind=None):
+        # Drops entries for one path and/or kind; no arguments clears all.
+        clauses, args = [], []
+        if path is not None:
+            clauses.append("path = ?")
+            args.append(os.path.abspath(path))
+        if kind is not None:
+            clauses.append("kind = ?")
+            args.append(kind)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        self.db.execute("DELETE FROM entries" + where, args)
+
+    def prune(self):
+        # LRU eviction down to max_bytes of payload.
+        total = 0
+        stale = []
+        rows = self.db.execute(
+            "SELECT rowid, length(payload) FROM entries ORDER BY last_used DESC")
+        for rowid, size in rows:
+            total += size
+            if total > self.max_bytes:
+                stale.append((rowid,))
+        if stale:
+            self.db.executemany("DELETE FROM entries WHERE rowid = ?", stale)
+        return len(stale)
+
+    def close(self):
+        if self.db is None:
+            return
+        self.prune()
+        self.db.commit()
+        self.db.close()
+        self.db = None
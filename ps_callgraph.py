@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+from array import array
+from collections import deque
+
+from ps_tree import analyze_tree
+
+# Cross-file call graph over analyze_tree() output.
+#
+# Every function definition becomes an integer node; names are interned
+# case-insensitively (as PowerShell resolves commands) into a hash index of
+# node ids. Edges live in compressed sparse row form: the callees of node n
+# are targets[offsets[n]:offsets[n + 1]], with a mirrored reverse CSR for
+# callers. A call resolves to a definition in the same file first, then in
+# files the caller dot-sources or imports (transitively), and only then to
+# every definition of that name in the tree.
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def module_index(paths):
+    # {lower-cased module name: [.psm1 paths]} for Import-Module by name
+    modules = {}
+    for path in paths:
+        stem, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() == '.psm1':
+            modules.setdefault(stem.lower(), []).append(path)
+    return modules
+
+
+def resolve_imports(path, imports, by_path, modules):
+    # Files that path dot-sources or imports; by_path maps normalized paths
+    # of the analyzed files to their original form.
+    resolved = []
+    for kind, target in imports:
+        rel = target
+        for root_var in ('${PSScriptRoot}', '$PSScriptRoot'):
+            rel = rel.replace(root_var, '.')
+        rel = rel.replace('\\', '/')
+        candidate = _normalize(os.path.join(os.path.dirname(path), rel))
+        if candidate in by_path:
+            resolved.append(by_path[candidate])
+        elif kind == 'module':
+            stem = os.path.splitext(os.path.basename(rel))[0].lower()
+            resolved.extend(modules.get(stem, []))
+    return resolved
+
+
+def import_closure(path, imports_of):
+    # Every file reachable from path through imports_of(file)
+    closure = set()
+    queue = deque(imports_of(path))
+    while queue:
+        current = queue.popleft()
+        if current in closure:
+            continue
+        closure.add(current)
+        queue.extend(imports_of(current))
+    return closure
+
+
+class CallGraph(object):
+
+    def __init__(self, tree):
+        self.names = []
+        self.paths = []
+        self.lines = array('i')
+        self.by_name = {}
+        self.by_file = {}
+        self.file_imports = {}
+        self._closures = {}
+
+        for path in sorted(tree['files']):
+            for func in tree['files'][path]:
+                node = len(self.names)
+                self.names.append(func['name'])
+                self.paths.append(path)
+                self.lines.append(func['line'])
+                self.by_name.setdefault(func['name'].lower(), []).append(node)
+                self.by_file.setdefault(path, []).append(node)
+
+        self._resolve_imports(tree)
+
+        edges = set()
+        for path in sorted(tree['files']):
+            for node, func in zip(self.by_file.get(path, []), tree['files'][path]):
+                for call in func['calls']:
+                    for target in self._resolve_call(path, call):
+                        if target != node:
+                            edges.add((node, target))
+
+        self.offsets, self.targets = self._csr(edges, 0)
+        self.rev_offsets, self.rev_targets = self._csr(edges, 1)
+
+    def _csr(self, edges, key):
+        # Packs (src, dst) pairs into offsets/targets arrays keyed by
+        # src (key=0) or dst (key=1).
+        other = 1 - key
+        ordered = sorted(edges, key=lambda edge: (edge[key], edge[other]))
+        offsets = array('i', [0]) * (len(self.names) + 1)
+        targets = array('i', [edge[other] for edge in ordered])
+        for edge in ordered:
+            offsets[edge[key] + 1] += 1
+        for n in range(len(self.names)):
+            offsets[n + 1] += offsets[n]
+        return offsets, targets
+
+    def _resolve_imports(self, tree):
+        by_path = dict((_normalize(path), path) for path in tree['files'])
+        modules = module_index(tree['files'])
+        for path, imports in tree.get('imports', {}).items():
+            self.file_imports[path] = resolve_imports(path, imports, by_path, modules)
+
+    def _import_closure(self, path):
+        closure = self._closures.get(path)
+        if closure is None:
+            closure = self._closures[path] = import_closure(
+                path, lambda current: self.file_imports.get(current, []))
+        return closure
+
+    def _resolve_call(self, path, name):
+        defs = self.by_name.get(name.lower(), [])
+        if len(defs) <= 1:
+            return defs
+        local = [node for node in defs if self.paths[node] == path]
+        if local:
+            return local
+        closure = self._import_closure(path)
+        imported = [node for node in defs if self.paths[node] in closure]
+        return imported or defs
+
+    # Queries -------------------------------------------------------------
+
+    def find(self, name):
+        return list(self.by_name.get(name.lower(), []))
+
+    def callees_of(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def callers_of(self, node):
+        return self.rev_targets[self.rev_offsets[node]:self.rev_offsets[node + 1]]
+
+    def callees(self, name):
+        return sorted(set(t for node in self.find(name) for t in self.callees_of(node)))
+
+    def callers(self, name):
+        return sorted(set(t for node in self.find(name) for t in self.callers_of(node)))
+
+    def walk(self, start, step):
+        # Nodes reachable from start through step (callees_of/callers_of)
+        seen = set()
+        queue = deque(start)
+        while queue:
+            node = queue.popleft()
+            for nxt in step(node):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    queue.append(nxt)
+        return seen
+
+    def reachable(self, name):
+        # Every function transitively called from name.
+        return sorted(self.walk(self.find(name), self.callees_of))
+
+    def reaching(self, name):
+        # Every function that transitively calls name.
+        return sorted(self.walk(self.find(name), self.callers_of))
+
+    def dead_functions(self):
+        # Functions nothing in the tree calls. Entry points invoked from
+        # pipelines or the command line show up here as well.
+        return [node for node in range(len(self.names))
+                if self.rev_offsets[node] == self.rev_offsets[node + 1]]
+
+    def describe(self, node):
+        return "{0}  {1}:{2}".format(self.names[node], self.paths[node], self.lines[node])
+
+
+def build_call_graph(root, workers=None, cache=None):
+    return CallGraph(analyze_tree(root, workers=workers, cache=cache))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the PowerShell call graph of a directory.")
+    parser.add_argument("root", nargs="?", default=".")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--callers", metavar="FUNCTION")
+    parser.add_argument("--callees", metavar="FUNCTION")
+    parser.add_argument("--reachable", metavar="FUNCTION")
+    parser.add_argument("--reaching", metavar="FUNCTION")
+    parser.add_argument("--dead", action="store_true")
+    args = parser.parse_args()
+
+    graph = build_call_graph(args.root, workers=args.workers)
+    print("✅ {0} functions, {1} call edges.".format(len(graph.names), len(graph.targets)))
+
+    queries = [
+        ("Callers of", args.callers, graph.callers),
+        ("Callees of", args.callees, graph.callees),
+        ("Reachable from", args.reachable, graph.reachable),
+        ("Functions reaching", args.reaching, graph.reaching),
+    ]
+    for title, name, query in queries:
+        if name:
+            nodes = query(name)
+            print("\n{0} {1} ({2}):".format(title, name, len(nodes)))
+            for node in nodes:
+                print(" - " + graph.describe(node))
+    if args.dead:
+        nodes = graph.dead_functions()
+        print("\nFunctions with no callers ({0}):".format(len(nodes)))
+        for node in nodes:
+            print(" - " + graph.describe(node))
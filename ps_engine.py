@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+import argparse
+import hashlib
+import os
+import time
+
+from ps_lexer import (LOOP_KEYWORDS, function_header, inline_params, is_assignment,
+                      is_param_block, iter_flow_records, iter_records)
+from ps_model import LEVEL_SECTIONS, LEVELS, FunctionSummary, Source
+from ps_report import (lazy_data_dir, level_sections, render_json, render_ndjson,
+                       render_steps, render_summary, write_lazy_report, write_report)
+from ps_source import FALLBACK_ENCODING, read_text_any_encoding
+from ps_stats import add_arguments, from_arguments, profiled, report, timed
+
+# Function analysis engine with selectable depth.
+#
+#   flow     conditions, loops, try/catch and variable assignments: the
+#            control-flow skeleton. Lines come from
+#            ps_lexer.iter_flow_records(), which never extracts
+#            identifiers, and no call, parameter or comment extractor runs.
+#   summary  adds parameters and calls.
+#   deep     adds comments and the full logic trace (every non-blank line).
+#
+# ps-flow-deep-parser.py is the deep level with its historical report, as
+# are script-flow.py (flow), finalscript.py and finalscript1.py (deep);
+# ps_tree.py runs any level over a whole repository.
+
+DEFAULT_LEVEL = 'deep'
+
+REPORT_TITLES = {
+    'flow': "PowerShell Script Flow Overview",
+    'summary': "PowerShell Script Function Summary",
+    'deep': "PowerShell Script Deep Function Summary",
+}
+
+
+def level_records(text, level=DEFAULT_LEVEL):
+    # The line records a level needs, streamed.
+    if level == 'flow':
+        return iter_flow_records(text)
+    return iter_records(text)
+
+
+def iter_functions(records, func_names):
+    # Yields each function ({name, start_line, lines}) as soon as its closing
+    # brace is seen and appends every declared name to func_names. Only the
+    # records of the function being collected are held, so records can be
+    # streamed straight from ps_lexer.iter_records().
+    in_func = False
+    brace_count = 0
+    opened = False
+    func_block = []
+    func_name = ""
+    func_start = 0
+
+    for rec in records:
+        if not in_func:
+            name = function_header(rec)
+            if name:
+                func_name = name
+                in_func = True
+                brace_count = rec['braces']
+                opened = rec['opens'] > 0
+                func_block = [rec]
+                func_start = rec['no']
+                func_names.append(func_name)
+                # One-line functions close on their own header line
+                if opened and brace_count <= 0:
+                    yield {
+                        "name": func_name,
+                        "start_line": func_start,
+                        "lines": func_block
+                    }
+                    in_func = False
+                continue
+
+        elif in_func:
+            brace_count += rec['braces']
+            opened = opened or rec['opens'] > 0
+            func_block.append(rec)
+            if opened and brace_count <= 0:
+                yield {
+                    "name": func_name,
+                    "start_line": func_start,
+                    "lines": func_block
+                }
+                in_func = False
+
+
+def collect_functions(records):
+    func_names = []
+    func_defs = list(iter_functions(records, func_names))
+    return func_defs, func_names
+
+
+def block_digest(func_lines):
+    # Content hash of a function block, used to reuse its analysis when the
+    # surrounding file changes but the function itself does not
+    h = hashlib.sha1()
+    for rec in func_lines:
+        h.update(rec['text'].encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def block_range(func_lines):
+    # (first line, last line, character offset, character length)
+    first, last = func_lines[0], func_lines[-1]
+    return first['no'], last['no'], first['start'], last['start'] + len(last['text']) - first['start']
+
+
+def known_names(names):
+    # Lookup set for resolve_calls(). PowerShell command names are
+    # case-insensitive, so every analyzer resolves calls case-folded.
+    return set(name.lower() for name in names)
+
+
+def resolve_calls(calls, known):
+    # The calls that name a function in known (from known_names())
+    return [call for call in calls if call.lower() in known]
+
+
+def scan_calls(func_lines, known_funcs=None, stats=None):
+    # Identifiers of the block in first-seen order that name a function in
+    # known_funcs, from known_names() (None keeps every identifier so
+    # callers can resolve them against a wider index). The name on the header line is
+    # the function itself, not a call; recursion in the body still counts.
+    # Counted as 'tokens' in stats.
+    calls = []
+    seen = set()
+    tokens = 0
+    own = function_header(func_lines[0]) if func_lines else None
+    for index, rec in enumerate(func_lines):
+        words = rec['words']
+        tokens += len(words)
+        for token in words:
+            if index == 0 and token == own:
+                continue
+            if (known_funcs is None or token.lower() in known_funcs) and token not in seen:
+                seen.add(token)
+                calls.append(token)
+    if stats is not None:
+        stats.count('tokens', tokens)
+    return calls
+
+
+def analyze_function_block(func_lines, known_funcs, source, level=DEFAULT_LEVEL, stats=None):
+    # Returns a FunctionSummary; its sections hold line indices into the
+    # block and are turned back into escaped text only when rendered.
+    # Extractors for sections the level does not collect are never run;
+    # the call scan is a separate pass, timed as its own 'calls' phase.
+    sections = LEVEL_SECTIONS[level]
+    want_params = 'params' in sections
+    want_comments = 'comments' in sections
+    want_vars = 'vars' in sections
+    want_calls = 'calls' in sections
+
+    first, last, offset, length = block_range(func_lines)
+    result = FunctionSummary(line=first, end_line=last, offset=offset, length=length,
+                             source=source, level=level)
+
+    for index, rec in enumerate(func_lines):
+        # Blank lines are not part of the logic trace
+        if not rec['text'] or rec['text'].isspace():
+            continue
+        keywords = rec['keywords']
+
+        # Extract param (index 0 is the header line)
+        if want_params:
+            if index == 0:
+                result.params.extend(inline_params(rec))
+            elif is_param_block(rec):
+                result.params.extend(rec['variables'])
+
+        # Detect logic
+        if want_comments and rec['comment']:
+            result.comments.append(index)
+        if keywords:
+            if 'if' in keywords:
+                result.ifs.append(index)
+            if 'elseif' in keywords:
+                result.ifs.append(index)
+            if 'else' in keywords:
+                result.ifs.append(index)
+            if not keywords.isdisjoint(LOOP_KEYWORDS):
+                result.loops.append(index)
+            if 'try' in keywords:
+                result.trycatch.append(index + 1)
+            if 'catch' in keywords:
+                result.trycatch.append(-(index + 1))
+        if want_vars and is_assignment(rec):
+            result.vars.append(index)
+
+    if want_calls:
+        with timed(stats, 'calls'):
+            result.calls = scan_calls(func_lines, known_funcs, stats)
+    return result
+
+
+# The indented trace of script-flow.py and finalscript.py: sections in
+# priority order (a line is labelled by the first one it is in).
+OUTLINE_SECTIONS = ('ifs', 'loops', 'trycatch', 'vars')
+OUTLINE_LABELS = {'loops': "LOOP", 'vars': "VAR"}
+
+
+def outline_steps(func_lines, details, sections=OUTLINE_SECTIONS, count_header=False):
+    # "├── IF: ..." for every line details put in one of sections, indented
+    # by the brace depth after the line. Depth starts after the header's
+    # own brace unless count_header (script-flow.py has always counted it).
+    # func_lines are the block's records, so this runs from analyze_text()'s
+    # on_function hook.
+    labels = {}
+    for key in reversed(sections):
+        if key == 'trycatch':
+            # "try { } catch { }" on one line is labelled TRY
+            for index in reversed(details.trycatch):
+                labels[abs(index) - 1] = "TRY" if index > 0 else "CATCH"
+        elif key == 'ifs':
+            for index in details.ifs:
+                keywords = func_lines[index]['keywords']
+                if 'elseif' in keywords:
+                    labels[index] = "ELSEIF"
+                elif 'if' in keywords:
+                    labels[index] = "IF"
+                else:
+                    labels[index] = "ELSE"
+        else:
+            for index in getattr(details, key):
+                labels[index] = OUTLINE_LABELS[key]
+
+    steps = []
+    depth = 0
+    for index, rec in enumerate(func_lines):
+        if index or count_header:
+            depth += rec['braces']
+        label = labels.get(index)
+        if label is None:
+            continue
+        step = "&nbsp;&nbsp;" * max(0, depth) + "├── " + label
+        if label != "ELSE":
+            step += ": " + details.text(index)
+        steps.append(step)
+    return steps
+
+
+def iter_analyzed(text, level=DEFAULT_LEVEL, stats=None, on_function=None, known=None,
+                  func_names=None):
+    # Yields the FunctionSummary of every function in text as soon as the
+    # lexer has passed its closing brace; line text is never copied out of
+    # the decoded source. With known (from known_names()) calls are resolved
+    # on the way, otherwise every identifier is kept. on_function(func_lines,
+    # details) is called for every function while its line records are
+    # still at hand, before it is yielded. func_names, when given, receives
+    # every declared name.
+    source = Source(text)
+    if func_names is None:
+        func_names = []
+    records = level_records(text, level)
+    if stats is not None:
+        records = stats.timed_records(records)
+    for func in iter_functions(records, func_names):
+        with timed(stats, 'analyze'):
+            details = analyze_function_block(func['lines'], None, source, level, stats)
+        details.name = func['name']
+        if known is not None:
+            details.calls = resolve_calls(details.calls, known)
+        if stats is not None:
+            stats.count('functions')
+        if on_function is not None:
+            on_function(func['lines'], details)
+        yield details
+
+
+def declared_names(text):
+    # The names iter_functions() finds in text, from the cheaper flow-level
+    # lexer pass. Lets streamed output resolve calls to functions declared
+    # further down before the full analysis has reached them.
+    func_names = []
+    for func in iter_functions(iter_flow_records(text), func_names):
+        pass
+    return func_names
+
+
+def analyze_text(text, level=DEFAULT_LEVEL, stats=None, on_function=None):
+    # Returns the FunctionSummary of every function in text, calls resolved
+    # against the functions the script itself declares. on_function is
+    # iter_analyzed()'s and sees the calls unresolved.
+    func_names = []
+    analyzed = list(iter_analyzed(text, level, stats, on_function, func_names=func_names))
+
+    # Calls to functions declared further down are only known now
+    if 'calls' in LEVEL_SECTIONS[level]:
+        with timed(stats, 'resolve'):
+            known = known_names(func_names)
+            for details in analyzed:
+                details.calls = resolve_calls(details.calls, known)
+    return analyzed
+
+
+HTML_HEADER = """<html><head><title>PowerShell Logic Analyzer</title>
+<style>
+body { font-family: Arial; padding: 20px; background: #fdfdfd; }
+h2 { color: #2c3e50; }
+.function-block { margin-bottom: 20px; border: 1px solid #ccc; border-radius: 6px; }
+pre { background: #f4f4f4; padding: 10px; font-family: monospace; overflow-x: auto; }
+button { background: #3498db; color: white; border: none; padding: 10px; width: 100%%; text-align: left; font-size: 15px; cursor: pointer; border-radius: 6px 6px 0 0; }
+ul { margin: 5px 0 10px 20px; padding: 0; }
+</style>
+<script>
+function toggle(id) {
+  var e = document.getElementById(id);
+  e.style.display = (e.style.display === "none") ? "block" : "none";
+}
+</script>
+</head><body>
+<h2>%s</h2>
+"""
+
+FUNCTION_TEMPLATE = ('<div class="function-block">'
+                     '<button onclick="toggle(\'%s\')">Function: %s (Line %d)</button>'
+                     '<div id="%s" style="display:none;"><div style="padding:10px;">%s'
+                     '<strong>Logic Trace:</strong><pre>%s</pre></div></div></div>')
+
+HTML_FOOTER = '<div><strong>Total Functions Found: %d</strong></div></body></html>'
+
+
+def render_html(analyzed, level=DEFAULT_LEVEL):
+    sections = level_sections(level)
+    yield HTML_HEADER % REPORT_TITLES[level]
+    for idx, func in enumerate(analyzed):
+        block_id = "block_" + str(idx)
+        yield FUNCTION_TEMPLATE % (block_id, func.name, func.line, block_id,
+                                   render_summary(func, sections), render_steps(func['steps']))
+    yield HTML_FOOTER % len(analyzed)
+
+
+def function_records(input_file, analyzed):
+    for func in analyzed:
+        record = func.to_record()
+        record['file'] = input_file
+        yield record
+
+
+def analyze_script(input_file, output_html, level=DEFAULT_LEVEL, lazy=False,
+                   output_format="html", stats=None, render=None, on_function=None, newline=""):
+    # Analyzes one script and writes its report. output_format "json"
+    # writes one document, "ndjson" one function per line; both go to
+    # output_html and ignore lazy, and are written while the analysis runs:
+    # each function's record is written as soon as on_function has seen
+    # it, NDJSON records flushed one by one. stats (a ps_stats.Stats)
+    # collects phase timings and counters for the run. render(analyzed),
+    # when given, yields the HTML page instead of render_html(); on_function
+    # is passed on to iter_analyzed(); newline is write_report()'s, for the
+    # HTML page.
+    started = time.perf_counter()
+    with timed(stats, 'decode'):
+        text, encoding = read_text_any_encoding(input_file)
+    print("Detected encoding:", encoding)
+
+    if output_format in ("json", "ndjson"):
+        # Records leave before the analysis has seen every function, so the
+        # names calls resolve against come from a flow-level pre-pass
+        known = None
+        if 'calls' in LEVEL_SECTIONS[level]:
+            with timed(stats, 'names'):
+                known = known_names(declared_names(text))
+        records = function_records(input_file, iter_analyzed(text, level, stats, on_function, known))
+        with timed(stats, 'write'):
+            if output_format == "json":
+                head = {'file': input_file, 'encoding': encoding}
+                write_report(output_html, render_json(records, head, "functions"))
+            else:
+                write_report(output_html, render_ndjson(records), flush_size=1)
+        created = "File created: %s" % output_html
+    else:
+        analyzed = analyze_text(text, level, stats, on_function)
+        with timed(stats, 'write'):
+            if lazy:
+                # Small index page; function details are loaded on demand
+                shards = write_lazy_report(output_html, REPORT_TITLES[level], analyzed,
+                                           sections=level_sections(level))
+                created = "File created: %s (%d data shards in %s)" % (
+                    output_html, shards, lazy_data_dir(output_html))
+            else:
+                chunks = render(analyzed) if render is not None else render_html(analyzed, level)
+                write_report(output_html, chunks, newline=newline)
+                created = "File created: %s" % output_html
+
+    if stats is not None:
+        stats.count('bytes_read', os.path.getsize(input_file))
+        if encoding == FALLBACK_ENCODING:
+            stats.count('encoding_fallbacks')
+        stats.count_written(output_html)
+        if lazy and output_format == "html":
+            stats.count_written(lazy_data_dir(output_html))
+        stats.file_done(input_file, time.perf_counter() - started)
+
+    print("✅ Done.", created)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze the functions of a PowerShell script.")
+    parser.add_argument("script")
+    parser.add_argument("--level", choices=LEVELS, default=DEFAULT_LEVEL,
+                        help="flow: control flow and assignments, summary: plus params and calls, "
+                             "deep: plus comments and the full logic trace (default: %(default)s)")
+    parser.add_argument("--format", choices=["html", "json", "ndjson"], default="html")
+    parser.add_argument("--output", help="report file (default: script_flow_<level>.<format>)")
+    parser.add_argument("--lazy", action="store_true",
+                        help="small HTML index page with details loaded on demand")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    output = args.output or "script_flow_{0}.{1}".format(args.level, args.format)
+    stats = from_arguments(args)
+    with profiled(args.profile):
+        analyze_script(args.script, output, args.level, lazy=args.lazy, output_format=args.format,
+                       stats=stats)
+    report(stats, args)
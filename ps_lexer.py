@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+import re
+from array import array
+
+# Single-pass PowerShell lexer shared by the flow analyzers.
+#
+# The whole script is scanned once by one compiled master pattern. Strings,
+# here-strings and comments are consumed as single tokens, so braces and
+# keywords inside them no longer affect brace counting or logic detection.
+# The token stream is folded into one record per physical line which the
+# analyzers consume instead of running their own regexes on every line.
+
+_TOKEN_RE = re.compile(r"""
+    (?P<comment><\#.*?\#>|\#[^\r\n]*)
+  | (?P<herestring>@"[ \t]*\r?\n.*?(?:\r\n|\r|\n)"@|@'[ \t]*\r?\n.*?(?:\r\n|\r|\n)'@)
+  | (?P<string>"(?:[^"`]|`.|"")*"|'(?:[^']|'')*')
+  | (?P<variable>\$(?:\{[^}\r\n]*\}|[A-Za-z_][\w:]*|[$?^]))
+  | (?P<word>[A-Za-z_][A-Za-z0-9_-]*)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<newline>\r\n|\r|\n)
+  | (?P<space>[ \t\f\v]+)
+  | (?P<lbrace>\{)
+  | (?P<rbrace>\})
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<op>.)
+""", re.DOTALL | re.VERBOSE)
+
+# Reduced pattern for iter_flow_records(): strings, comments, braces and
+# keywords are matched exactly as above. Everything between them (other
+# words, variables, numbers, operators, spaces) is consumed as one unlabelled
+# run, which stops wherever _TOKEN_RE would start one of those tokens.
+_FLOW_KEYWORD = (r"(?i:foreach-object|foreach|for|elseif|else|if|while|try|catch|finally|param|function)"
+                 r"(?![A-Za-z0-9_-])")
+
+_FLOW_TOKEN_RE = re.compile(r"""
+    (?P<comment><\#.*?\#>|\#[^\r\n]*)
+  | (?P<herestring>@"[ \t]*\r?\n.*?(?:\r\n|\r|\n)"@|@'[ \t]*\r?\n.*?(?:\r\n|\r|\n)'@)
+  | (?P<string>"(?:[^"`]|`.|"")*"|'(?:[^']|'')*')
+  | (?P<newline>\r\n|\r|\n)
+  | (?P<lbrace>\{)
+  | (?P<rbrace>\})
+  | (?P<keyword>%(keyword)s)
+  | (?:[^"'\#@{}\r\n<$A-Za-z_]+
+     | \$(?:\{[^}\r\n]*\}|[A-Za-z_][\w:]*|[$?^])?
+     | (?!%(keyword)s)[A-Za-z_][A-Za-z0-9_-]*
+     | @(?!["'][ \t]*\r?\n)
+     | <(?!\#)
+    )+
+""" % {'keyword': _FLOW_KEYWORD}, re.DOTALL | re.VERBOSE)
+
+# First token of a line, after its indentation
+_HEAD_RE = re.compile(r"[ \t\f\v]*(?:" + _TOKEN_RE.pattern + ")", re.DOTALL | re.VERBOSE)
+
+_NEWLINE_RE = re.compile(r'\r\n|\r|\n')
+_FUNC_NAME_RE = re.compile(r'^\s*function\s+([^\s({]+)', re.IGNORECASE)
+_INLINE_PARAMS_RE = re.compile(r'^\s*function\s+[^\s({]+\s*\(([^)]*)\)', re.IGNORECASE)
+_DOT_SOURCE_RE = re.compile(r'''^\s*\.\s+(?:"([^"]+)"|'([^']+)'|([^\s;|]+))''')
+_IMPORT_MODULE_RE = re.compile(
+    r'''^\s*Import-Module\s+(?:-Name\s+)?(?:"([^"]+)"|'([^']+)'|([^\s;|]+))''', re.IGNORECASE)
+
+# Lower-cased words the analyzers care about; anything else is an identifier.
+KEYWORDS = frozenset([
+    'if', 'elseif', 'else', 'for', 'foreach', 'foreach-object', 'while',
+    'try', 'catch', 'finally', 'param', 'function',
+])
+LOOP_KEYWORDS = frozenset(['for', 'foreach', 'foreach-object', 'while'])
+
+_NO_KEYWORDS = frozenset()
+
+
+def tokenize(text):
+    # Yields (kind, value, line) for every significant token. Whitespace is
+    # dropped; newlines are kept so consumers can track physical lines.
+    line = 1
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'space':
+            continue
+        value = m.group()
+        yield kind, value, line
+        if kind == 'newline':
+            line += 1
+        elif kind in ('comment', 'herestring', 'string'):
+            line += len(_NEWLINE_RE.findall(value))
+
+
+def line_starts(text):
+    # Offset of the first character of every line, splitting exactly where
+    # scan_lines() does (entry n - 1 is the start of record n).
+    starts = array('l', [0])
+    for m in _NEWLINE_RE.finditer(text):
+        starts.append(m.end())
+    if len(starts) > 1 and starts[-1] == len(text):
+        starts.pop()
+    return starts
+
+
+def _new_record(no, start):
+    return {
+        'no': no,
+        'text': "",
+        'start': start,
+        'head': None,
+        'second': None,
+        'comment': False,
+        'braces': 0,
+        'opens': 0,
+        'words': [],
+        'variables': [],
+        'keywords': _NO_KEYWORDS,
+    }
+
+
+def iter_records(text):
+    # Yields one record per physical line (line 1 first) as soon as the line
+    # is complete, so callers that keep only what they need never hold the
+    # whole file as records:
+    #   text       the raw line including its line terminator
+    #   head       (kind, value) of the first token starting on the line
+    #   second     (kind, value) of the token following head
+    #   comment    True when the line starts with a comment
+    #   braces     net brace delta, ignoring braces inside strings/comments
+    #   opens      number of opening braces on the line
+    #   words      identifier tokens in source order
+    #   variables  $variable tokens in source order
+    #   keywords   lower-cased KEYWORDS present on the line
+    rec = _new_record(1, 0)
+    count = 0
+    keywords = None
+
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'space':
+            continue
+
+        if kind == 'newline':
+            end = m.end()
+            rec['text'] = text[rec['start']:end]
+            if keywords:
+                rec['keywords'] = frozenset(keywords)
+            yield rec
+            rec = _new_record(rec['no'] + 1, end)
+            count = 0
+            keywords = None
+            continue
+
+        value = m.group()
+        if count == 0:
+            rec['head'] = (kind, value)
+            rec['comment'] = kind == 'comment'
+        elif count == 1:
+            rec['second'] = (kind, value)
+        count += 1
+
+        if kind == 'word':
+            rec['words'].append(value)
+            lower = value.lower()
+            if lower in KEYWORDS:
+                if keywords is None:
+                    keywords = set()
+                keywords.add(lower)
+        elif kind == 'variable':
+            rec['variables'].append(value)
+        elif kind == 'lbrace':
+            rec['braces'] += 1
+            rec['opens'] += 1
+        elif kind == 'rbrace':
+            rec['braces'] -= 1
+        elif kind in ('comment', 'herestring', 'string'):
+            # Multi-line token: the lines it spans belong to the record it
+            # started on, followed by empty continuation records.
+            pos = m.start()
+            for nl in _NEWLINE_RE.finditer(value):
+                end = pos + nl.end()
+                rec['text'] = text[rec['start']:end]
+                if keywords:
+                    rec['keywords'] = frozenset(keywords)
+                yield rec
+                rec = _new_record(rec['no'] + 1, end)
+                # Continuation lines of a string or block comment are
+                # still inside that token.
+                rec['head'] = (kind, "")
+                rec['comment'] = kind == 'comment'
+                count = 1
+                keywords = None
+
+    if rec['start'] < len(text):
+        rec['text'] = text[rec['start']:]
+        if keywords:
+            rec['keywords'] = frozenset(keywords)
+        yield rec
+
+
+def _flow_record(text, no, start, end, head, braces, opens, keywords):
+    second = None
+    if head is None:
+        # The first token of a line that does not continue a multi-line token
+        m = _HEAD_RE.match(text, start)
+        if m is not None and m.lastgroup != 'newline' and m.lastgroup != 'space':
+            head = (m.lastgroup, m.group(m.lastgroup))
+            if head[0] == 'variable':
+                # Enough for is_assignment()
+                m = _HEAD_RE.match(text, m.end())
+                if m is not None and m.lastgroup != 'newline':
+                    second = (m.lastgroup, m.group(m.lastgroup))
+    return {
+        'no': no,
+        'text': text[start:end],
+        'start': start,
+        'head': head,
+        'second': second,
+        'comment': head is not None and head[0] == 'comment',
+        'braces': braces,
+        'opens': opens,
+        'keywords': frozenset(keywords) if keywords else _NO_KEYWORDS,
+    }
+
+
+def iter_flow_records(text):
+    # Cheaper variant of iter_records() for control-flow analysis. Records
+    # carry the same no, text, start, head, comment, braces, opens and
+    # keywords, but no words or variables: identifiers are never extracted,
+    # and only the first token of each line is classified, plus the second
+    # one after a $variable so is_assignment() works.
+    no = 1
+    start = 0
+    head = None
+    braces = opens = 0
+    keywords = None
+
+    for m in _FLOW_TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind is None:
+            continue
+
+        if kind == 'newline':
+            end = m.end()
+            yield _flow_record(text, no, start, end, head, braces, opens, keywords)
+            no += 1
+            start = end
+            head = None
+            braces = opens = 0
+            keywords = None
+        elif kind == 'keyword':
+            if keywords is None:
+                keywords = set()
+            keywords.add(m.group().lower())
+        elif kind == 'lbrace':
+            braces += 1
+            opens += 1
+        elif kind == 'rbrace':
+            braces -= 1
+        else:
+            value = m.group()
+            if '\n' not in value and '\r' not in value:
+                continue
+            # Multi-line token: continuation records as in iter_records()
+            pos = m.start()
+            for nl in _NEWLINE_RE.finditer(value):
+                end = pos + nl.end()
+                yield _flow_record(text, no, start, end, head, braces, opens, keywords)
+                no += 1
+                start = end
+                head = (kind, "")
+                braces = opens = 0
+                keywords = None
+
+    if start < len(text):
+        yield _flow_record(text, no, start, len(text), head, braces, opens, keywords)
+
+
+def scan_lines(text):
+    # Returns every record of iter_records() as a list (index 0 is line 1).
+    return list(iter_records(text))
+
+
+def function_header(rec):
+    # Returns the function name declared on this line, or None.
+    head = rec['head']
+    if head is None or head[0] != 'word' or head[1].lower() != 'function':
+        return None
+    match = _FUNC_NAME_RE.match(rec['text'])
+    if match:
+        return match.group(1)
+    return None
+
+
+def inline_params(rec):
+    # $variables of an inline "function Name($a, $b)" parameter list.
+    match = _INLINE_PARAMS_RE.match(rec['text'])
+    if not match:
+        return []
+    return [value for kind, value, line in tokenize(match.group(1)) if kind == 'variable']
+
+
+def starts_with(rec, keyword):
+    head = rec['head']
+    return head is not None and head[0] == 'word' and head[1].lower() == keyword
+
+
+def is_assignment(rec):
+    # "$name = ..." at the start of the line.
+    head, second = rec['head'], rec['second']
+    return (head is not None and head[0] == 'variable'
+            and second is not None and second == ('op', '='))
+
+
+def is_param_block(rec):
+    # "param(" at the start of the line.
+    return starts_with(rec, 'param') and rec['second'] is not None and rec['second'][0] == 'lparen'
+
+
+def record_import(rec):
+    # ('dot', target) for a dot-sourced script, ('module', target) for an
+    # Import-Module line, otherwise None.
+    head = rec['head']
+    if head == ('op', '.'):
+        match = _DOT_SOURCE_RE.match(rec['text'])
+        kind = 'dot'
+    elif starts_with(rec, 'import-module'):
+        match = _IMPORT_MODULE_RE.match(rec['text'])
+        kind = 'module'
+    else:
+        return None
+    if match:
+        return kind, match.group(1) or match.group(2) or match.group(3)
+    return None
+
+
+def script_imports(records):
+    # Returns [('dot', target)] for dot-sourced scripts and
+    # [('module', target)] for Import-Module lines, in source order.
+    imports = []
+    for rec in records:
+        item = record_import(rec)
+        if item:
+            imports.append(item)
+    return imports
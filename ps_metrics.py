@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import argparse
+import datetime
+import json
+import os
+import sys
+from array import array
+
+from ps_cache import DEFAULT_CACHE_FILE, AnalysisCache
+from ps_model import LINE_SECTIONS
+from ps_tree import analyze_tree
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Columnar export of per-function metrics for fleet-wide analytics.
+#
+# One row per function: where it is (file, name, line range) and how much
+# logic it holds (counts of params, variables, conditions, loops, try/catch
+# lines, comments and resolved calls). Columns are kept as typed arrays;
+# strings are dictionary-encoded into int32 codes. They are written either
+# as Parquet when pyarrow is installed, or as a plain column directory: one
+# raw file per column (native byte order, recorded in schema.json) that
+# numpy.fromfile or a memory map can load without parsing.
+
+STRING_COLUMNS = ('snapshot', 'file', 'name')
+INT_COLUMNS = ('line', 'end_line', 'lines', 'params') + LINE_SECTIONS + ('trycatch', 'calls')
+SCHEMA_FILE = "schema.json"
+
+
+class MetricColumns(object):
+
+    def __init__(self):
+        self.rows = 0
+        self.codes = dict((name, array('i')) for name in STRING_COLUMNS)
+        self.dictionaries = dict((name, []) for name in STRING_COLUMNS)
+        self._lookup = dict((name, {}) for name in STRING_COLUMNS)
+        self.ints = dict((name, array('i')) for name in INT_COLUMNS)
+
+    def _encode(self, column, value):
+        lookup = self._lookup[column]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self.dictionaries[column])
+            self.dictionaries[column].append(value)
+        self.codes[column].append(code)
+
+    def add(self, snapshot, path, func):
+        self._encode('snapshot', snapshot)
+        self._encode('file', path)
+        self._encode('name', func.name)
+        ints = self.ints
+        ints['line'].append(func.line)
+        ints['end_line'].append(func.end_line)
+        ints['lines'].append(func.end_line - func.line + 1)
+        ints['params'].append(len(func.params))
+        for key in LINE_SECTIONS:
+            ints[key].append(len(getattr(func, key)))
+        ints['trycatch'].append(len(func.trycatch))
+        ints['calls'].append(len(func.calls))
+        self.rows += 1
+
+    def column(self, name):
+        # Decoded values of one column, for small exports and inspection.
+        if name in self.ints:
+            return self.ints[name].tolist()
+        dictionary = self.dictionaries[name]
+        return [dictionary[code] for code in self.codes[name]]
+
+
+def collect_metrics(tree, snapshot):
+    columns = MetricColumns()
+    for path in sorted(tree['files']):
+        for func in tree['files'][path]:
+            columns.add(snapshot, path, func)
+    return columns
+
+
+def write_column_dir(columns, out_dir):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    schema = {'rows': columns.rows, 'byteorder': sys.byteorder, 'columns': []}
+    for name in STRING_COLUMNS:
+        with open(os.path.join(out_dir, name + ".codes"), "wb") as f:
+            columns.codes[name].tofile(f)
+        schema['columns'].append({
+            'name': name,
+            'type': 'dictionary<int32, string>',
+            'itemsize': columns.codes[name].itemsize,
+            'dictionary': columns.dictionaries[name],
+        })
+    for name in INT_COLUMNS:
+        with open(os.path.join(out_dir, name + ".values"), "wb") as f:
+            columns.ints[name].tofile(f)
+        schema['columns'].append({
+            'name': name,
+            'type': 'int32',
+            'itemsize': columns.ints[name].itemsize,
+        })
+    with open(os.path.join(out_dir, SCHEMA_FILE), "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_parquet(columns, path):
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is not installed; use the column directory format")
+    data = {}
+    for name in STRING_COLUMNS:
+        data[name] = pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(columns.codes[name], type=pyarrow.int32()),
+            pyarrow.array(columns.dictionaries[name], type=pyarrow.string()))
+    for name in INT_COLUMNS:
+        data[name] = pyarrow.array(columns.ints[name], type=pyarrow.int32())
+    pyarrow.parquet.write_table(pyarrow.table(data), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-function metrics of a PowerShell tree as columns.")
+    parser.add_argument("root", nargs="?", default=".")
+    parser.add_argument("--out", default="function_metrics",
+                        help="output directory, or .parquet file (default: %(default)s)")
+    parser.add_argument("--format", choices=["auto", "parquet", "columns"], default="auto",
+                        help="auto writes Parquet when pyarrow is available")
+    parser.add_argument("--snapshot", default=datetime.date.today().isoformat(),
+                        help="label stored on every row, e.g. a date or commit (default: today)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "parquet" if pyarrow is not None else "columns"
+    elif fmt == "parquet" and pyarrow is None:
+        parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+
+    print("🔍 Analyzing PowerShell files under {0}...".format(args.root))
+    with AnalysisCache(DEFAULT_CACHE_FILE) as cache:
+        tree = analyze_tree(args.root, workers=args.workers, cache=cache)
+    columns = collect_metrics(tree, args.snapshot)
+
+    out = args.out
+    if fmt == "parquet":
+        if not out.endswith(".parquet"):
+            out += ".parquet"
+        write_parquet(columns, out)
+    else:
+        write_column_dir(columns, out)
+    print("✅ Done. {0} function rows written to {1} ({2}).".format(columns.rows, out, fmt))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from array import array
+
+from ps_lexer import line_starts
+from ps_source import read_text_any_encoding
+
+# Compact per-function analysis results.
+#
+# A FunctionSummary does not hold any source text. The line-based sections
+# (vars, ifs, loops, comments, trycatch) are arrays of line indices relative
+# to the function's first line, and steps is simply every non-blank line of
+# the function. The lines are cut out of one shared Source and HTML-escaped
+# only when a report asks for them with summary[key], so a whole-repository
+# analysis keeps a few integers per line instead of several escaped copies.
+# Relative indices stay valid when a function moves within its file.
+
+LINE_SECTIONS = ('vars', 'ifs', 'loops', 'comments')
+
+PAYLOAD_KEYS = ('name', 'line', 'end_line', 'offset', 'length', 'hash', 'level',
+                'params', 'calls', 'trycatch') + LINE_SECTIONS
+
+# Analysis levels (see ps_engine) and the sections each one fills in.
+# 'steps' is the full logic trace; without it the trace only lists the
+# lines of the sections that were collected.
+LEVELS = ('flow', 'summary', 'deep')
+LEVEL_SECTIONS = {
+    'flow': ('vars', 'ifs', 'loops', 'trycatch'),
+    'summary': ('params', 'vars', 'ifs', 'loops', 'trycatch', 'calls'),
+    'deep': ('params', 'vars', 'ifs', 'loops', 'trycatch', 'calls', 'comments', 'steps'),
+}
+
+
+def escape_html(text):
+    return text.replace("&", "&lt;").replace(">", "&gt;").replace("&", "&amp;")
+
+
+class Source(object):
+    # One script's text plus the offset of every line. Built from text that
+    # is already in memory, or from a path that is only read on first use.
+
+    __slots__ = ('path', '_text', '_starts')
+
+    def __init__(self, text=None, path=None):
+        self.path = path
+        self._text = text
+        self._starts = None
+
+    def line(self, no):
+        # Raw text of line no (1-based) including its line terminator.
+        if self._text is None:
+            self._text, encoding = read_text_any_encoding(self.path)
+        if self._starts is None:
+            self._starts = line_starts(self._text)
+        starts = self._starts
+        end = starts[no] if no < len(starts) else len(self._text)
+        return self._text[starts[no - 1]:end]
+
+
+class FunctionSummary(object):
+
+    __slots__ = PAYLOAD_KEYS + ('source',)
+
+    def __init__(self, name=None, line=0, end_line=0, offset=0, length=0, source=None,
+                 level='deep'):
+        self.name = name
+        self.line = line
+        self.end_line = end_line
+        self.offset = offset
+        self.length = length
+        self.hash = None
+        self.level = level
+        self.params = []
+        self.calls = []
+        # TRY lines are stored as index + 1, CATCH lines as -(index + 1)
+        self.trycatch = array('i')
+        for key in LINE_SECTIONS:
+            setattr(self, key, array('i'))
+        self.source = source
+
+    def raw(self, index):
+        # Stripped source text of the index-th line of the function.
+        return self.source.line(self.line + index).strip()
+
+    def text(self, index):
+        # Escaped, stripped text of the index-th line of the function.
+        return escape_html(self.raw(index))
+
+    def trace(self):
+        # (line number, stripped text) of every non-blank line: the full
+        # logic trace of the deep level
+        for no in range(self.line, self.end_line + 1):
+            stripped = self.source.line(no).strip()
+            if stripped:
+                yield no, stripped
+
+    def steps(self):
+        if 'steps' not in LEVEL_SECTIONS[self.level]:
+            indices = set(abs(index) - 1 for index in self.trycatch)
+            for key in LINE_SECTIONS:
+                indices.update(getattr(self, key))
+            return [self.text(index) for index in sorted(indices)]
+        return [escape_html(stripped) for no, stripped in self.trace()]
+
+    def __getitem__(self, key):
+        # Dictionary-style access as the renderers expect; text sections
+        # are materialized on every call.
+        if key in LINE_SECTIONS:
+            return [self.text(index) for index in getattr(self, key)]
+        if key == 'trycatch':
+            return [("TRY: " if index > 0 else "CATCH: ") + self.text(abs(index) - 1)
+                    for index in self.trycatch]
+        if key == 'steps':
+            return self.steps()
+        if key not in PAYLOAD_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_record(self):
+        # Plain (unescaped) structured form for JSON/NDJSON output; section
+        # entries carry their absolute line number.
+        record = {
+            'name': self.name,
+            'line': self.line,
+            'end_line': self.end_line,
+            'level': self.level,
+            'params': self.params,
+            'calls': self.calls,
+        }
+        for key in LINE_SECTIONS:
+            record[key] = [{'line': self.line + index, 'text': self.raw(index)}
+                           for index in getattr(self, key)]
+        record['trycatch'] = [{'line': self.line + abs(index) - 1,
+                               'kind': "try" if index > 0 else "catch",
+                               'text': self.raw(abs(index) - 1)}
+                              for index in self.trycatch]
+        # Below deep the trace is only the section lines above
+        if 'steps' in LEVEL_SECTIONS[self.level]:
+            record['steps'] = [{'line': no, 'text': stripped} for no, stripped in self.trace()]
+        return record
+
+    def replace(self, **changes):
+        # Shallow copy with some fields changed.
+        copy = FunctionSummary.__new__(FunctionSummary)
+        for key in self.__slots__:
+            setattr(copy, key, changes.get(key, getattr(self, key)))
+        return copy
+
+    def to_payload(self):
+        # JSON-friendly dict without the source.
+        payload = {}
+        for key in PAYLOAD_KEYS:
+            value = getattr(self, key)
+            payload[key] = value.tolist() if isinstance(value, array) else value
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload, source=None):
+        summary = cls.__new__(cls)
+        for key in PAYLOAD_KEYS:
+            value = payload.get(key)
+            if key == 'trycatch' or key in LINE_SECTIONS:
+                value = array('i', value)
+            setattr(summary, key, value)
+        summary.source = source
+        return summary
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+import glob
+import json
+import os
+
+from ps_model import LEVEL_SECTIONS
+
+# Shared HTML report rendering for the flow analyzers.
+#
+# Each analyzer describes its page with module-level %-templates and a
+# generator that yields the page as chunks. write_report() batches those
+# chunks into large writelines() calls instead of one write per tag, either
+# streaming (flush every flush_size characters) or fully buffered
+# (flush_size=None).
+
+FLUSH_SIZE = 1 << 16
+
+LIST_TEMPLATE = "<strong>%s (%d):</strong><ul>%s</ul>"
+
+# The summary lists every analyzer shows, in display order.
+SUMMARY_SECTIONS = [
+    ("Parameters", 'params'),
+    ("Variables", 'vars'),
+    ("Conditions", 'ifs'),
+    ("Loops", 'loops'),
+    ("Try/Catch", 'trycatch'),
+    ("Function Calls", 'calls'),
+    ("Comments", 'comments'),
+]
+
+
+def render_list(title, items):
+    if items:
+        body = "<li>" + "</li><li>".join(items) + "</li>"
+    else:
+        body = ""
+    return LIST_TEMPLATE % (title, len(items), body)
+
+
+def level_sections(level):
+    # The SUMMARY_SECTIONS an analysis level fills in.
+    return [(title, key) for title, key in SUMMARY_SECTIONS if key in LEVEL_SECTIONS[level]]
+
+
+def render_summary(func, sections=SUMMARY_SECTIONS):
+    return "".join([render_list(title, func[key]) for title, key in sections])
+
+
+def render_steps(steps):
+    if not steps:
+        return ""
+    return "<br>".join(steps) + "<br>"
+
+
+def write_report(path, chunks, newline="", flush_size=FLUSH_SIZE):
+    # newline="" writes "\n" untranslated, as codecs.open() did; pass None
+    # for the platform line ending of a plain text-mode open(). Every batch
+    # is flushed so readers see it at once; flush_size=1 flushes each chunk.
+    with open(path, "w", encoding="utf-8", newline=newline) as out:
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if flush_size is not None and size >= flush_size:
+                out.writelines(buffer)
+                out.flush()
+                buffer = []
+                size = 0
+        out.writelines(buffer)
+
+
+# Structured output. Both forms are generators for write_report(), so
+# records are serialized one at a time as they are pulled from records and
+# reach the file in flush_size batches instead of as one document built in
+# memory.
+
+def render_ndjson(records):
+    # One JSON document per line.
+    for record in records:
+        yield _dump(record) + "\n"
+
+
+def render_json(records, head=None, key="records"):
+    # A single JSON object: the fields of head plus key -> [records].
+    head = _dump(head or {})
+    yield head[:-1] + ("," if len(head) > 2 else "") + _dump(key) + ":["
+    for i, record in enumerate(records):
+        yield ("," if i else "") + _dump(record)
+    yield "]}\n"
+
+
+# Lazy report: a constant-size page plus a data directory holding the
+# function index and the per-function details split into shards. Data files
+# are JSONP-style scripts rather than .json so the page also works when
+# opened from file://, where fetch() is blocked. The function list is
+# virtualized: only the rows in view exist in the DOM.
+
+SHARD_SIZE = 100
+
+LAZY_PAGE_TEMPLATE = """<html><head><title>%(title)s</title>
+<style>
+body { font-family: Arial; padding: 20px; background: #fdfdfd; }
+h2 { color: #2c3e50; }
+#layout { display: flex; gap: 20px; }
+#side { width: 40%%; }
+#search { padding: 6px; width: 100%%; margin-bottom: 10px; font-size: 14px; box-sizing: border-box; }
+#list { height: 80vh; overflow-y: auto; position: relative; border: 1px solid #ccc; border-radius: 6px; }
+.row { position: absolute; left: 0; right: 0; height: %(row)dpx; background: #3498db; color: white; border: none; border-bottom: 1px solid #fff; padding: 0 10px; text-align: left; font-size: 15px; cursor: pointer; overflow: hidden; white-space: nowrap; }
+.row:hover { background: #2980b9; }
+#detail { flex: 1; border: 1px solid #ccc; border-radius: 6px; padding: 10px; height: 80vh; overflow-y: auto; }
+pre { background: #f4f4f4; padding: 10px; font-family: monospace; overflow-x: auto; }
+ul { margin: 5px 0 10px 20px; padding: 0; }
+</style>
+</head><body>
+<h2>%(title)s</h2>
+<div id="layout">
+<div id="side"><input type="text" id="search" placeholder="Filter functions...">
+<div id="list"><div id="spacer"></div><div id="rows"></div></div></div>
+<div id="detail">Select a function.</div>
+</div>
+<div><strong>Total Functions Found: <span id="total">0</span></strong></div>
+<script>
+var ROW = %(row)d, DATA = %(data)s, SECTIONS = %(sections)s;
+var all = [], view = [], shards = {}, waiting = {}, timer = null;
+function esc(s) { return String(s).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;"); }
+function load(name) {
+  var s = document.createElement("script");
+  s.src = DATA + "/" + name;
+  document.head.appendChild(s);
+}
+window.psReport = {
+  index: function (rows) {
+    all = rows; view = rows;
+    document.getElementById("total").textContent = rows.length;
+    render();
+  },
+  shard: function (n, funcs) {
+    shards[n] = funcs;
+    (waiting[n] || []).forEach(function (cb) { cb(funcs); });
+    delete waiting[n];
+  }
+};
+function withShard(n, cb) {
+  if (shards[n]) return cb(shards[n]);
+  if (!waiting[n]) { waiting[n] = []; load("shard_" + n + ".js"); }
+  waiting[n].push(cb);
+}
+function render() {
+  var list = document.getElementById("list");
+  document.getElementById("spacer").style.height = (view.length * ROW) + "px";
+  var first = Math.floor(list.scrollTop / ROW);
+  var last = Math.min(view.length, first + Math.ceil(list.clientHeight / ROW) + 5);
+  var html = [];
+  for (var i = first; i < last; i++) {
+    var f = view[i];
+    html.push('<button class="row" style="top:' + (i * ROW) + 'px" onclick="show(' + f[4] + ')">Function: ' +
+              esc(f[0]) + ' (Line ' + f[1] + ')</button>');
+  }
+  document.getElementById("rows").innerHTML = html.join("");
+}
+function show(id) {
+  var f = all[id];
+  withShard(f[2], function (funcs) {
+    var d = funcs[f[3]], html = ["<h3>Function: " + esc(f[0]) + " (Line " + f[1] + ")</h3>"];
+    SECTIONS.forEach(function (s) {
+      var items = d[s[1]];
+      html.push("<strong>" + s[0] + " (" + items.length + "):</strong><ul>");
+      items.forEach(function (item) { html.push("<li>" + item + "</li>"); });
+      html.push("</ul>");
+    });
+    html.push("<strong>Logic Trace:</strong><pre>" + d.steps.join("<br>") + (d.steps.length ? "<br>" : "") + "</pre>");
+    document.getElementById("detail").innerHTML = html.join("");
+  });
+}
+document.getElementById("list").addEventListener("scroll", function () { window.requestAnimationFrame(render); });
+document.getElementById("search").addEventListener("input", function () {
+  var q = this.value.toLowerCase();
+  clearTimeout(timer);
+  timer = setTimeout(function () {
+    view = q ? all.filter(function (f) { return f[0].toLowerCase().indexOf(q) > -1; }) : all;
+    document.getElementById("list").scrollTop = 0;
+    render();
+  }, 150);
+});
+</script>
+<script src="%(index)s"></script>
+</body></html>"""
+
+LAZY_ROW_HEIGHT = 34
+
+
+def lazy_data_dir(output_html):
+    return os.path.splitext(output_html)[0] + "_data"
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def shard_payload(n, funcs, sections=SUMMARY_SECTIONS):
+    keys = [key for title, key in sections] + ['steps']
+    return "psReport.shard(%d,%s);" % (n, _dump([dict((key, func[key]) for key in keys) for func in funcs]))
+
+
+def _write_if_changed(path, content, written):
+    # written maps paths to the content last written there; None always writes
+    if written is not None:
+        if written.get(path) == content:
+            return False
+        written[path] = content
+    write_report(path, [content])
+    return True
+
+
+def write_lazy_report(output_html, title, functions, shard_size=SHARD_SIZE, written=None,
+                      sections=SUMMARY_SECTIONS):
+    # Writes output_html plus <name>_data/{index,shard_N}.js and returns the
+    # number of shards. Pass the same written dict on every call to rewrite
+    # only the files whose content changed since the previous call.
+    data_dir = lazy_data_dir(output_html)
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    data_name = os.path.basename(data_dir)
+
+    index = []
+    shard_count = 0
+    for start in range(0, len(functions), shard_size):
+        funcs = functions[start:start + shard_size]
+        for offset, func in enumerate(funcs):
+            index.append([func['name'], func['line'], shard_count, offset, len(index)])
+        _write_if_changed(os.path.join(data_dir, "shard_%d.js" % shard_count),
+                          shard_payload(shard_count, funcs, sections), written)
+        shard_count += 1
+
+    # Drop shards left over from a previous, larger run
+    for path in glob.glob(os.path.join(data_dir, "shard_*.js")):
+        n = os.path.basename(path)[len("shard_"):-len(".js")]
+        if n.isdigit() and int(n) >= shard_count:
+            os.remove(path)
+            if written is not None:
+                written.pop(path, None)
+
+    _write_if_changed(os.path.join(data_dir, "index.js"), "psReport.index(%s);" % _dump(index), written)
+    _write_if_changed(output_html, LAZY_PAGE_TEMPLATE % {
+        'title': title,
+        'row': LAZY_ROW_HEIGHT,
+        'data': _dump(data_name),
+        'sections': _dump(sections),
+        'index': data_name + "/index.js",
+    }, written)
+    return shard_count
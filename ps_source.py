@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import codecs
+import mmap
+import os
+
+# Source decoding shared by the analyzers.
+#
+# The codec is picked once from the byte-order mark or, failing that, from a
+# bounded prefix of the file; the file is then read (or memory-mapped) once
+# and decoded once. Windows-authored scripts are mostly UTF-16, which used to
+# be reached only after several failed full-file decodes.
+
+PROBE_SIZE = 64 * 1024
+MMAP_THRESHOLD = 8 * 1024 * 1024
+FALLBACK_ENCODING = 'latin1'
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def detect_encoding(prefix):
+    # Picks a codec from the first bytes of a file.
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # BOM-less UTF-16: ASCII-range text leaves every other byte NUL
+    if b'\x00' in prefix:
+        sample = prefix[:4096]
+        even = sample[0::2].count(b'\x00')
+        odd = sample[1::2].count(b'\x00')
+        if odd > even * 2:
+            return 'utf-16-le'
+        if even > odd * 2:
+            return 'utf-16-be'
+
+    # The probe may end mid-character, so decode it incrementally
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+
+
+def _decode(data, encoding):
+    try:
+        return str(data, encoding), encoding
+    except UnicodeDecodeError:
+        # The probe looked clean but the rest of the file is not
+        return str(data, FALLBACK_ENCODING), FALLBACK_ENCODING
+
+
+def read_text_any_encoding(path):
+    # Returns (text, encoding) after a single read and a single decode.
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            # Decode straight from the mapping instead of copying into bytes
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                encoding = detect_encoding(mm[:PROBE_SIZE])
+                return _decode(mm, encoding)
+        data = f.read()
+    return decode_bytes(data)
+
+
+def decode_bytes(data):
+    # (text, encoding) of a file's bytes that were already read.
+    encoding = detect_encoding(data[:PROBE_SIZE])
+    return _decode(data, encoding)
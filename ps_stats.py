@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# Run instrumentation for the analyzers.
+#
+# A Stats object collects wall-clock seconds per phase (decode, lex,
+# analyze, ...), the duration of every file and a few counters. It is
+# handed down as an optional stats= argument the same way cache= is: with
+# None nothing is timed or counted. A phase entered inside another one is
+# charged to itself only, so phases never overlap. Worker processes fill
+# their own Stats and send back to_dict(), which the parent folds in with
+# merge(). The summary is written as JSON and as a Prometheus textfile for
+# the node_exporter textfile collector.
+
+COUNTERS = ('files', 'cached_files', 'lines', 'functions', 'tokens',
+            'bytes_read', 'bytes_written', 'encoding_fallbacks')
+
+DEFAULT_SLOWEST = 10
+METRIC_PREFIX = "ps_analyzer"
+
+_COUNTER_HELP = {
+    'files': "Files analyzed.",
+    'cached_files': "Files served from the analysis cache.",
+    'lines': "Source lines lexed.",
+    'functions': "Functions found.",
+    'tokens': "Identifier tokens scanned for calls.",
+    'bytes_read': "Bytes of source read.",
+    'bytes_written': "Bytes of report output written.",
+    'encoding_fallbacks': "Files decoded with the fallback encoding.",
+}
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = dict((name, 0) for name in COUNTERS)
+        self.files = {}
+        self.started = time.perf_counter()
+        self.elapsed = None
+        # Seconds spent in nested phases, per open phase
+        self._nested = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            spent = time.perf_counter() - started
+            inner = self._nested.pop()
+            self.phases[name] = self.phases.get(name, 0.0) + spent - inner
+            if self._nested:
+                self._nested[-1] += spent
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed_records(self, records):
+        # Passes lexer records through, charging the time spent producing
+        # them to the lex phase and counting lines. Records pulled inside
+        # another phase (a report written while the analysis runs) are
+        # charged to lex only.
+        clock = time.perf_counter
+        iterator = iter(records)
+        spent = 0.0
+        lines = 0
+        try:
+            while True:
+                started = clock()
+                try:
+                    rec = next(iterator)
+                except StopIteration:
+                    spent += clock() - started
+                    return
+                spent += clock() - started
+                lines += 1
+                yield rec
+        finally:
+            self.phases['lex'] = self.phases.get('lex', 0.0) + spent
+            if self._nested:
+                self._nested[-1] += spent
+            self.count('lines', lines)
+
+    def file_done(self, path, seconds):
+        self.files[path] = seconds
+        self.count('files')
+
+    def count_written(self, *paths):
+        # Adds the size of each output file, or of every file in a directory.
+        for path in paths:
+            if os.path.isdir(path):
+                for name in os.listdir(path):
+                    self.count('bytes_written', os.path.getsize(os.path.join(path, name)))
+            elif os.path.exists(path):
+                self.count('bytes_written', os.path.getsize(path))
+
+    def merge(self, data):
+        # Folds in the to_dict() of another Stats, e.g. from a worker.
+        for name, seconds in data['phases'].items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, n in data['counters'].items():
+            self.count(name, n)
+        self.files.update(data['files'])
+
+    def slowest(self, n=DEFAULT_SLOWEST):
+        return sorted(self.files.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def to_dict(self):
+        # Full, mergeable form including every per-file duration.
+        return {'phases': self.phases, 'counters': self.counters, 'files': self.files}
+
+    def summary(self, slowest=DEFAULT_SLOWEST):
+        if self.elapsed is None:
+            self.finish()
+        return {
+            'elapsed_seconds': self.elapsed,
+            'phases': self.phases,
+            'counters': self.counters,
+            'slowest': [{'path': path, 'seconds': seconds} for path, seconds in self.slowest(slowest)],
+        }
+
+
+@contextmanager
+def timed(stats, name):
+    # stats.phase(name), or nothing when stats is None.
+    if stats is None:
+        yield
+    else:
+        with stats.phase(name):
+            yield
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(stats, slowest=DEFAULT_SLOWEST, prefix=METRIC_PREFIX, labels=None):
+    # Prometheus text exposition of one run; labels (e.g. {'job': 'nightly'})
+    # are added to every sample.
+    extra = sorted((labels or {}).items())
+
+    def sample(name, value, **own):
+        tags = ",".join('%s="%s"' % (key, _label(val)) for key, val in sorted(own.items()) + extra)
+        return "%s_%s%s %s\n" % (prefix, name, "{%s}" % tags if tags else "", repr(value))
+
+    def header(name, help_text):
+        return "# HELP %s_%s %s\n# TYPE %s_%s gauge\n" % (prefix, name, help_text, prefix, name)
+
+    summary = stats.summary(slowest)
+    lines = [header("run_seconds", "Wall-clock seconds of the whole run."),
+             sample("run_seconds", summary['elapsed_seconds'])]
+    lines.append(header("phase_seconds", "Wall-clock seconds spent per analysis phase."))
+    for name in sorted(summary['phases']):
+        lines.append(sample("phase_seconds", summary['phases'][name], phase=name))
+    for name in sorted(summary['counters']):
+        lines.append(header(name, _COUNTER_HELP.get(name, name + ".")))
+        lines.append(sample(name, summary['counters'][name]))
+    lines.append(header("file_seconds", "Seconds spent on each of the slowest files."))
+    for item in summary['slowest']:
+        lines.append(sample("file_seconds", item['seconds'], path=item['path']))
+    return "".join(lines)
+
+
+def _write_atomic(path, content):
+    # The textfile collector may read at any time, so never expose a
+    # half-written file
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_json(stats, path, slowest=DEFAULT_SLOWEST):
+    _write_atomic(path, json.dumps(stats.summary(slowest), indent=2, ensure_ascii=False) + "\n")
+
+
+def write_prometheus(stats, path, slowest=DEFAULT_SLOWEST, labels=None):
+    _write_atomic(path, render_prometheus(stats, slowest, labels=labels))
+
+
+@contextmanager
+def profiled(path):
+    # Runs the body under cProfile and dumps pstats data to path (view with
+    # python -m pstats path); a no-op when path is None.
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+# Command-line options shared by the analyzer entry points.
+
+def add_arguments(parser, profile_help=None):
+    parser.add_argument("--stats-json", help="write phase timings and counters as JSON to this file")
+    parser.add_argument("--stats-prom", help="write them as a Prometheus textfile (e.g. for node_exporter)")
+    parser.add_argument("--slowest", type=int, default=DEFAULT_SLOWEST,
+                        help="slowest files to report (default: %(default)s)")
+    parser.add_argument("--profile", help=profile_help or
+                        "run under cProfile and write pstats data to this file")
+
+
+def from_arguments(args):
+    # A Stats when the command line asked for stats output, else None.
+    if args.stats_json or args.stats_prom:
+        return Stats()
+    return None
+
+
+def report(stats, args):
+    # Writes the stats output and notes the command line asked for.
+    if stats is not None:
+        stats.finish()
+        if args.stats_json:
+            write_json(stats, args.stats_json, args.slowest)
+        if args.stats_prom:
+            write_prometheus(stats, args.stats_prom, args.slowest)
+        for path, seconds in stats.slowest(args.slowest):
+            print("  {0:8.3f}s  {1}".format(seconds, path))
+    if args.profile:
+        print("Profile written to {0} (view with: python -m pstats {0})".format(args.profile))
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from fs_scan import scan_tree
+from ps_cache import DEFAULT_CACHE_FILE, AnalysisCache, read_stamped
+from ps_engine import (DEFAULT_LEVEL, analyze_function_block, block_digest,
+                       block_range, iter_functions, known_names, level_records,
+                       resolve_calls)
+from ps_lexer import record_import
+from ps_model import LEVELS, FunctionSummary, Source
+from ps_source import FALLBACK_ENCODING, decode_bytes, read_text_any_encoding
+from ps_stats import Stats, add_arguments, from_arguments, profiled, report
+
+# Repository-wide PowerShell analysis. Every .ps1/.psm1 file under a root is
+# run through iter_functions + analyze_function_block from ps_engine.py on a
+# process pool, and the per-file results are merged into one cross-file
+# function index. The analysis level (flow, summary, deep) applies to the
+# whole run; each level has its own cache entries.
+
+POWERSHELL_EXTENSIONS = ('.ps1', '.psm1')
+CACHE_KIND = "ps-functions"
+
+
+def cache_kind(level=DEFAULT_LEVEL):
+    if level == DEFAULT_LEVEL:
+        return CACHE_KIND
+    return CACHE_KIND + "-" + level
+
+
+def find_powershell_files(root, ignore=None):
+    scan = scan_tree(root, POWERSHELL_EXTENSIONS, ignore=ignore)
+    paths = []
+    for ext in POWERSHELL_EXTENSIONS:
+        paths.extend(scan[ext])
+    paths.sort()
+    return paths
+
+
+def analyze_file(path, previous=None, instrument=False, level=DEFAULT_LEVEL, stamped=False):
+    # Worker entry point: returns (path, {'functions', 'imports'}, error).
+    # Calls are left unresolved (every identifier is kept) until the parent
+    # has seen every file and knows the full set of function names.
+    # previous is the function list from an earlier analysis of the file;
+    # functions whose block hash is unchanged reuse it instead of being
+    # re-analyzed. With instrument the analysis also carries the file's
+    # Stats.to_dict() under 'stats', which analyze_tree() takes out again.
+    # With stamped it carries the cache stamp of the bytes it analyzed under
+    # 'stamp', likewise taken out before the analysis is cached.
+    started = time.perf_counter()
+    stats = Stats() if instrument else None
+
+    def read():
+        if not stamped:
+            return read_text_any_encoding(path) + (None,)
+        data, stamp = read_stamped(path)
+        return decode_bytes(data) + (stamp,)
+
+    try:
+        if stats is None:
+            text, encoding, stamp = read()
+        else:
+            with stats.phase('decode'):
+                text, encoding, stamp = read()
+            stats.count('bytes_read', os.path.getsize(path))
+            if encoding == FALLBACK_ENCODING:
+                stats.count('encoding_fallbacks')
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+    reuse = {}
+    for func in previous or []:
+        if 'hash' in func:
+            reuse[func['hash']] = func
+
+    source = Source(text)
+    imports = []
+    func_names = []
+
+    def records():
+        # Streams the lexer output, picking up imports on the way
+        lexed = level_records(text, level)
+        if stats is not None:
+            lexed = stats.timed_records(lexed)
+        for rec in lexed:
+            item = record_import(rec)
+            if item:
+                imports.append(list(item))
+            yield rec
+
+    def summarize(func):
+        digest = block_digest(func['lines'])
+        if digest in reuse:
+            summary = FunctionSummary.from_payload(reuse[digest])
+            summary.line, summary.end_line, summary.offset, summary.length = \
+                block_range(func['lines'])
+        else:
+            summary = analyze_function_block(func['lines'], None, source, level, stats)
+        summary.name = func['name']
+        summary.hash = digest
+        return summary.to_payload()
+
+    functions = []
+    for func in iter_functions(records(), func_names):
+        if stats is None:
+            functions.append(summarize(func))
+        else:
+            with stats.phase('analyze'):
+                functions.append(summarize(func))
+    analysis = {'functions': functions, 'imports': imports}
+    if stats is not None:
+        stats.count('functions', len(functions))
+        stats.file_done(path, time.perf_counter() - started)
+        analysis['stats'] = stats.to_dict()
+    if stamp is not None:
+        analysis['stamp'] = stamp
+    return path, analysis, None
+
+
+def merge_results(results, resolve=True):
+    files = {}
+    imports = {}
+    errors = {}
+    index = {}
+
+    for path, analysis, error in results:
+        if error:
+            errors[path] = error
+            continue
+        # Text sections are read back from the file only if rendered
+        source = Source(path=path)
+        files[path] = [FunctionSummary.from_payload(func, source) for func in analysis['functions']]
+        imports[path] = analysis['imports']
+        for func in files[path]:
+            index.setdefault(func.name, []).append(path)
+
+    # Resolve calls against every function defined anywhere in the tree
+    if resolve:
+        known = known_names(index)
+        for functions in files.values():
+            for func in functions:
+                func.calls = resolve_calls(func.calls, known)
+
+    return {
+        'files': files,
+        'imports': imports,
+        'functions': index,
+        'errors': errors,
+    }
+
+
+def analyze_tree(root, workers=None, cache=None, paths=None, resolve=True, stats=None,
+                 level=DEFAULT_LEVEL):
+    # paths lets callers that already scanned the tree skip a second walk;
+    # resolve=False keeps every identifier in 'calls' for later resolution
+    if paths is None:
+        paths = find_powershell_files(root)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    kind = cache_kind(level)
+    results = []
+    pending = paths
+    previous = [None] * len(paths)
+    if cache is not None:
+        started = time.perf_counter()
+        pending = []
+        previous = []
+        for path in paths:
+            analysis = cache.lookup(kind, path)
+            if analysis is None:
+                # A changed file re-analyzes only its edited functions
+                stale = cache.lookup_stale(kind, path)
+                pending.append(path)
+                previous.append(stale['functions'] if stale else None)
+            else:
+                results.append((path, analysis, None))
+        if stats is not None:
+            stats.phases['cache'] = time.perf_counter() - started
+            stats.count('cached_files', len(results))
+
+    instrument = [stats is not None] * len(pending)
+    levels = [level] * len(pending)
+    stamped = [cache is not None] * len(pending)
+    if workers <= 1 or len(pending) <= 1:
+        fresh = list(map(analyze_file, pending, previous, instrument, levels, stamped))
+    else:
+        # Small files dominate real repositories, so hand them out in chunks
+        # to keep the inter-process overhead below the parsing cost.
+        chunksize = max(1, len(pending) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fresh = list(pool.map(analyze_file, pending, previous, instrument, levels, stamped,
+                                  chunksize=chunksize))
+
+    # Phase times are summed over workers, so with a pool they can exceed
+    # the elapsed time of the run
+    for path, analysis, error in fresh:
+        if analysis is not None and 'stats' in analysis:
+            stats.merge(analysis.pop('stats'))
+
+    # Store before merging: the cache keeps calls unresolved
+    if cache is not None:
+        for path, analysis, error in fresh:
+            if not error:
+                stamp = analysis.pop('stamp')
+                cache.store(kind, path, analysis, stamp)
+
+    results.extend(fresh)
+    results.sort(key=lambda result: result[0])
+    if stats is None:
+        return merge_results(results, resolve=resolve)
+    with stats.phase('merge'):
+        return merge_results(results, resolve=resolve)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze every PowerShell file under a directory.")
+    parser.add_argument("root", nargs="?", default=".")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE,
+                        help="analysis cache file (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--level", choices=LEVELS, default=DEFAULT_LEVEL,
+                        help="analysis depth; flow and summary are cheaper (default: %(default)s)")
+    add_arguments(parser, profile_help="run under cProfile and write pstats data to this file "
+                  "(parent process only; add --workers 1 to profile the analysis itself)")
+    args = parser.parse_args()
+
+    stats = from_arguments(args)
+    print("🔍 Analyzing PowerShell files under {0}...".format(args.root))
+    with profiled(args.profile):
+        if args.no_cache:
+            tree = analyze_tree(args.root, workers=args.workers, stats=stats, level=args.level)
+        else:
+            with AnalysisCache(args.cache) as cache:
+                tree = analyze_tree(args.root, workers=args.workers, cache=cache, stats=stats,
+                                    level=args.level)
+                print("Cache: {0} hits, {1} misses".format(cache.hits, cache.misses))
+
+    for path, error in sorted(tree['errors'].items()):
+        print("Could not read script file: {0} ({1})".format(path, error))
+
+    total = sum(len(functions) for functions in tree['files'].values())
+    print("✅ Done. {0} files, {1} functions, {2} unique names.".format(
+        len(tree['files']), total, len(tree['functions'])))
+
+    report(stats, args)
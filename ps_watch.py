@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import time
+
+from ps_engine import (REPORT_TITLES, analyze_function_block, block_range,
+                       collect_functions, known_names, render_html, resolve_calls)
+from ps_lexer import scan_lines
+from ps_model import Source
+from ps_report import lazy_data_dir, write_lazy_report, write_report
+from ps_source import read_text_any_encoding
+
+# Watch mode for ps-flow-deep-parser.py.
+#
+# A ScriptModel keeps the last analysis of one script in memory. On every
+# save the file is re-lexed (one regex pass) and the lines that differ from
+# the previous version are narrowed to one range by trimming the common
+# prefix and suffix. Functions outside that range keep their analysis and
+# are only shifted to their new line; functions inside it are re-analyzed.
+# The report is then rewritten, in lazy mode only the shards whose content
+# changed. Changes are detected by polling os.stat, which works the same
+# on every platform and network share.
+
+POLL_INTERVAL = 0.5
+
+_POSITION_KEYS = ('no', 'start')
+
+
+def _same_records(old, new):
+    # Line numbers and offsets aside, identical records analyze identically.
+    # Comparing them (not just the text) catches lexer state changes such as
+    # an unterminated here-string above the function.
+    if len(old) != len(new):
+        return False
+    for a, b in zip(old, new):
+        for key in a:
+            if key not in _POSITION_KEYS and a[key] != b[key]:
+                return False
+    return True
+
+
+class ScriptModel(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.encoding = None
+        self.lines = []
+        self.functions = []
+        self.known_funcs = set()
+        self.reanalyzed = 0
+
+    def _changed_range(self, lines):
+        # Returns (first changed line index, line count delta, first index of
+        # the unchanged suffix in the new lines).
+        old = self.lines
+        limit = min(len(old), len(lines))
+        prefix = 0
+        while prefix < limit and old[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < limit - prefix
+               and old[len(old) - 1 - suffix] == lines[len(lines) - 1 - suffix]):
+            suffix += 1
+        return prefix, len(lines) - len(old), len(lines) - suffix
+
+    def update(self):
+        # Re-reads the script and returns the number of functions that had
+        # to be re-analyzed.
+        text, self.encoding = read_text_any_encoding(self.path)
+        records = scan_lines(text)
+        lines = [rec['text'] for rec in records]
+        prefix, delta, suffix_start = self._changed_range(lines)
+
+        previous = dict((func['start'], func) for func in self.functions)
+        func_defs, func_names = collect_functions(records)
+        source = Source(text)
+
+        functions = []
+        self.reanalyzed = 0
+        for func in func_defs:
+            start = func['start_line']
+            end = start + len(func['lines']) - 1
+            old = None
+            if end <= prefix:
+                old = previous.get(start)
+            elif start > suffix_start:
+                old = previous.get(start - delta)
+            if (old is None or old['summary'].name != func['name']
+                    or not _same_records(old['records'], func['lines'])):
+                # Calls are kept unfiltered; the known names can change
+                # anywhere in the file, so filtering happens in analyzed()
+                summary = analyze_function_block(func['lines'], None, source)
+                self.reanalyzed += 1
+            else:
+                first, last, offset, length = block_range(func['lines'])
+                summary = old['summary'].replace(line=first, end_line=last, offset=offset,
+                                                 length=length, source=source)
+            summary.name = func['name']
+            functions.append({
+                'start': start,
+                'records': func['lines'],
+                'summary': summary,
+            })
+
+        self.lines = lines
+        self.functions = functions
+        self.known_funcs = known_names(func_names)
+        return self.reanalyzed
+
+    def analyzed(self):
+        # Same list parse_powershell_script() builds
+        result = []
+        for func in self.functions:
+            summary = func['summary']
+            result.append(summary.replace(
+                calls=resolve_calls(summary.calls, self.known_funcs)))
+        return result
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(input_file, output_html="script_flow_deep.html", lazy=True,
+          interval=POLL_INTERVAL, iterations=None):
+    # Rebuilds output_html whenever input_file changes. iterations bounds
+    # the number of polls (None runs until interrupted).
+    model = ScriptModel(input_file)
+    written = {}
+    stamp = None
+    polls = 0
+
+    while iterations is None or polls < iterations:
+        current = _stamp(input_file)
+        if current is not None and current != stamp:
+            stamp = current
+            started = time.time()
+            try:
+                reanalyzed = model.update()
+            except (OSError, ValueError) as e:
+                print("Could not read script file: {0} ({1})".format(input_file, e))
+            else:
+                analyzed = model.analyzed()
+                if lazy:
+                    before = dict(written)
+                    write_lazy_report(output_html, REPORT_TITLES['deep'], analyzed, written=written)
+                    rewritten = sum(1 for path in written if written[path] != before.get(path))
+                    report = "{0} file(s) rewritten in {1}".format(rewritten, lazy_data_dir(output_html))
+                else:
+                    write_report(output_html, render_html(analyzed))
+                    report = output_html + " rewritten"
+                print("🔄 {0}: {1}/{2} functions re-analyzed, {3} ({4:.0f} ms)".format(
+                    input_file, reanalyzed, len(analyzed), report, (time.time() - started) * 1000))
+        polls += 1
+        if iterations is None or polls < iterations:
+            time.sleep(interval)
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate the deep flow report whenever a script changes.")
+    parser.add_argument("script")
+    parser.add_argument("--output", default="script_flow_deep.html")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between checks (default: %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="write the single-page report instead of the lazy one")
+    args = parser.parse_args()
+
+    print("👀 Watching {0} (Ctrl+C to stop)...".format(args.script))
+    try:
+        watch(args.script, args.output, lazy=not args.full, interval=args.interval)
+    except KeyboardInterrupt:
+        pass
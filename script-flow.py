@@ -1,67 +1,13 @@
 # -*- coding: utf-8 -*-
-import re
 
-def escape_html(text):
-    return text.replace("&", "&lt;").replace("<", "&gt;").replace("&", "&amp;")
+from ps_engine import analyze_script, outline_steps
+from ps_report import render_steps
 
-def read_lines_any_encoding(path):
-    # Try multiple encodings until one works
-    encodings = ['utf-8', 'utf-8-sig', 'utf-16', 'utf-16-le', 'utf-16-be', 'iso-8859-1']
-    for enc in encodings:
-        try:
-            with open(path, "r", encoding=enc) as f:
-                return f.readlines()
-        except Exception:
-            continue
-    raise ValueError("❌ Unable to decode file with common encodings")
+# The flow level of ps_engine.py, shown as the indented outline trace only.
+LEVEL = 'flow'
+OUTLINE_SECTIONS = ('ifs', 'loops', 'vars')
 
-def parse_powershell_script(input_file, output_html="script_flow.html"):
-    lines = read_lines_any_encoding(input_file)
-
-    func_map = []
-    inside_function = False
-    current_func = None
-    brace_count = 0
-
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        if stripped.startswith("#") or not stripped:
-            continue
-
-        if not inside_function:
-            match = re.match(r'^\s*function\s+([^\s({]+)', stripped, re.IGNORECASE)
-            if match:
-                current_func = {
-                    'name': match.group(1),
-                    'line': i + 1,
-                    'steps': []
-                }
-                func_map.append(current_func)
-                inside_function = True
-                brace_count = 0
-
-        if inside_function:
-            brace_count += line.count("{") - line.count("}")
-            prefix = "&nbsp;&nbsp;" * max(0, brace_count)
-
-            if re.match(r'^\s*if\b', stripped, re.IGNORECASE):
-                current_func['steps'].append(prefix + "├── IF: " + escape_html(stripped))
-            elif re.match(r'^\s*elseif\b', stripped, re.IGNORECASE):
-                current_func['steps'].append(prefix + "├── ELSEIF: " + escape_html(stripped))
-            elif re.match(r'^\s*else\b', stripped, re.IGNORECASE):
-                current_func['steps'].append(prefix + "├── ELSE")
-            elif re.match(r'^\s*(for|foreach|while)\b', stripped, re.IGNORECASE):
-                current_func['steps'].append(prefix + "├── LOOP: " + escape_html(stripped))
-            elif re.match(r'^\s*\$\w+\s*=', stripped):
-                current_func['steps'].append(prefix + "├── VAR: " + escape_html(stripped))
-
-            if brace_count <= 0:
-                inside_function = False
-                current_func = None
-
-    # Generate HTML
-    with open(output_html, "w", encoding="utf-8") as out:
-        out.write("""<html><head><title>PowerShell Script Flow</title>
+HTML_HEADER = """<html><head><title>PowerShell Script Flow</title>
 <style>
 body { font-family: Arial; padding: 20px; }
 h2 { color: #2c3e50; }
@@ -80,24 +26,31 @@ function toggle(id) {
 </script>
 </head><body>
 <h2>PowerShell Script Logic Overview</h2>
-""")
+"""
+
+FUNCTION_TEMPLATE = ('<div class="function-block">'
+                     '<button onclick="toggle(\'%s\')">Function: %s (Line %d)</button>'
+                     '<div id="%s" style="display:none;"><pre>%s</pre></div></div>')
+
+HTML_FOOTER = '<div class="summary"><strong>Total functions found: %d</strong></div></body></html>'
+
+def render_html(func_map, outlines):
+    yield HTML_HEADER
+    for idx, func in enumerate(func_map):
+        block_id = "block_" + str(idx)
+        steps = render_steps(outlines[idx]) or "  (No logic found)"
+        yield FUNCTION_TEMPLATE % (block_id, func['name'], func['line'], block_id, steps)
+    yield HTML_FOOTER % len(func_map)
 
-        for idx, func in enumerate(func_map):
-            block_id = "block_" + str(idx)
-            out.write('<div class="function-block">')
-            out.write('<button onclick="toggle(\'%s\')">Function: %s (Line %d)</button>' % (block_id, func['name'], func['line']))
-            out.write('<div id="%s" style="display:none;"><pre>' % block_id)
-            if func['steps']:
-                for step in func['steps']:
-                    out.write(step + "<br>")
-            else:
-                out.write("  (No logic found)")
-            out.write('</pre></div></div>')
+def parse_powershell_script(input_file, output_html="script_flow.html", stats=None):
+    outlines = []
 
-        out.write('<div class="summary"><strong>Total functions found: %d</strong></div>' % len(func_map))
-        out.write("</body></html>")
+    def keep_outline(func_lines, details):
+        outlines.append(outline_steps(func_lines, details, OUTLINE_SECTIONS, count_header=True))
 
-    print("✅ script_flow.html created — open it in your browser.")
+    analyze_script(input_file, output_html, LEVEL,
+                   render=lambda func_map: render_html(func_map, outlines),
+                   stats=stats, on_function=keep_outline, newline=None)
 
 # 🔁 Call like this:
 # parse_powershell_script("your_script.ps1")
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+import sys
+
+# The analyzers are standalone scripts with hyphenated file names, so they
+# cannot be imported with a plain import statement. load_script() imports
+# one of them by file name and registers it in sys.modules under an
+# importable alias, so helpers (and pickled references to them in worker
+# processes) resolve to a single module object.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def module_name(filename):
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return base.replace("-", "_").lower()
+
+
+def load_script(filename):
+    name = module_name(filename)
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[name]
+        raise
+    return module
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from change_impact import apply_changes, build_index, impacted
+
+CORE = """function Remove-Old {
+    Write-Host "old"
+}
+function Keep-It {
+    Write-Host "keep"
+}
+"""
+
+USER = """. $PSScriptRoot/core.ps1
+function Use-Old {
+    Remove-Old
+}
+"""
+
+
+def test_callers_of_a_deleted_function_are_impacted(tmp_path):
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    (lib / "core.ps1").write_text(CORE)
+    (lib / "user.ps1").write_text(USER)
+    index = build_index(str(tmp_path), workers=1)
+
+    (lib / "core.ps1").write_text(CORE.split("function Keep-It")[0].replace("Remove-Old", "Keep-It"))
+    processed, removed = apply_changes(index, str(tmp_path), ["lib/core.ps1"])
+    assert removed == ["remove-old"]
+
+    names = [func['name'] for func in impacted(index, processed, removed)['functions']]
+    assert "Use-Old" in names
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ps_engine import analyze_script, analyze_text
+from ps_tree import analyze_tree
+
+SCRIPT = """function Get-A {
+    Write-Host 1
+}
+function get-b {
+    get-a
+}
+"""
+
+
+def test_calls_resolve_case_insensitively_in_file_and_tree_mode(tmp_path):
+    (tmp_path / "lib.ps1").write_text(SCRIPT)
+    single = [(func.name, func.calls) for func in analyze_text(SCRIPT, 'summary')]
+    tree = analyze_tree(str(tmp_path), workers=1, level='summary')
+    merged = [(func.name, func.calls) for func in tree['files'][str(tmp_path / "lib.ps1")]]
+    assert single == merged == [('Get-A', []), ('get-b', ['get-a'])]
+
+
+def test_ndjson_streams_resolved_records_with_deep_steps(tmp_path):
+    # Get-C calls Get-D, which the analysis only reaches afterwards
+    script = tmp_path / "fwd.ps1"
+    script.write_text("function Get-C {\n    Get-D\n}\nfunction Get-D {\n    Write-Host 1\n}\n")
+    output = tmp_path / "fwd.ndjson"
+    analyze_script(str(script), str(output), 'deep', output_format="ndjson")
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(rec['name'], rec['calls']) for rec in records] == [('Get-C', ['Get-D']), ('Get-D', [])]
+    assert records[0]['steps'] == [{'line': 1, 'text': "function Get-C {"},
+                                   {'line': 2, 'text': "Get-D"},
+                                   {'line': 3, 'text': "}"}]
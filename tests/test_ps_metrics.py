@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ps_metrics import collect_metrics
+from ps_tree import analyze_tree
+
+SCRIPT = """function Get-A {
+    $x = 1
+}
+function Get-B {
+    Get-A
+}
+"""
+
+
+def test_calls_column_counts_only_real_calls(tmp_path):
+    (tmp_path / "lib.ps1").write_text(SCRIPT)
+    columns = collect_metrics(analyze_tree(str(tmp_path), workers=1), "snap")
+    calls = dict(zip(columns.column('name'), columns.column('calls')))
+    assert calls == {'Get-A': 0, 'Get-B': 1}